@@ -0,0 +1,79 @@
+"""Score every legal move of a position by splitting the root moves across processes.
+
+    python analysis.py --depth 5
+    python analysis.py --fen "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+Each root move is an independent search with a full window, so the moves are
+handed to a ProcessPoolExecutor one at a time and the scores merged into a
+ranking of the whole move list. Worker processes keep one Search each, so a
+worker scoring several moves of the same position reuses its transposition
+table.
+"""
+
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from chess import MATE_SCORE, MAX_PLY, START_FEN, Board, Search, move_uci
+
+MoveScore = namedtuple("MoveScore", "move score nodes")
+
+_searches = {}  # hash size in MB -> Search, per worker process
+
+
+def _score_move(fen, move, depth, hash_mb):
+    search = _searches.get(hash_mb)
+    if search is None:
+        search = _searches[hash_mb] = Search(hash_mb)
+    score, = search.score_moves(Board.from_fen(fen), [move], depth)
+    return MoveScore(move, score, search.nodes)
+
+
+def rank_moves(board, depth, workers=None, hash_mb=16, executor=None):
+    """Return a MoveScore for every legal move of board, best first.
+
+    Scores are in centipawns from the side to move's point of view, after a
+    depth-ply search of each move. Pass an executor to reuse its worker
+    processes across calls; otherwise a pool of workers processes, by
+    default one per CPU, is started for this call.
+    """
+    moves = list(board.legal_moves())
+    if not moves:
+        return []
+    fen = board.to_fen()
+    tasks = ([fen] * len(moves), moves, [depth] * len(moves), [hash_mb] * len(moves))
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_score_move, *tasks))
+    else:
+        results = list(executor.map(_score_move, *tasks))
+    results.sort(key=lambda result: result.score, reverse=True)
+    return results
+
+
+def format_score(score):
+    if abs(score) >= MATE_SCORE - MAX_PLY:
+        plies = MATE_SCORE - abs(score)
+        return "%s%d" % ("#" if score > 0 else "#-", (plies + 1) // 2)
+    return "%+.2f" % (score / 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every legal move of a position")
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB per worker")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    ranking = rank_moves(Board.from_fen(args.fen), args.depth, args.workers, args.hash)
+    elapsed = time.perf_counter() - started
+    for rank, result in enumerate(ranking, 1):
+        print("%3d. %-6s %7s  %9d nodes" % (rank, move_uci(result.move), format_score(result.score),
+                                            result.nodes))
+    nodes = sum(result.nodes for result in ranking)
+    print("%d moves, %d nodes in %.2fs, %.0f nps"
+          % (len(ranking), nodes, elapsed, nodes / elapsed if elapsed else 0))
@@ -1,9 +1,237 @@
 
+import argparse
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import sys
+import time
+import weakref
 from abc import ABC, abstractmethod
+from array import array
 from typing import List, Optional
 from enum import Enum
+from multiprocessing import shared_memory
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# Piece codes index Board.bitboards: white pieces are 0-5, black pieces 6-11
+PIECE_SYMBOLS = "PNBRQKpnbrqk"
+
+SQUARE_NAMES = [f + r for r in "12345678" for f in "abcdefgh"]
+SQUARE_INDEX = {name: square for square, name in enumerate(SQUARE_NAMES)}
+
+# Moves are ints: start square in bits 0-5, end square in bits 6-11, flags in bits 12-15
+QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE = 0, 1, 2, 3, 4, 5
+PROMOTION = 8  # promotion flags are PROMOTION | (kind - KNIGHT), plus CAPTURE when capturing
+
+WHITE_OO, WHITE_OOO, BLACK_OO, BLACK_OOO = 1, 2, 4, 8
+ALL_CASTLING = WHITE_OO | WHITE_OOO | BLACK_OO | BLACK_OOO
+
+# Castling rights that survive a move from or to each square
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[0] &= ~WHITE_OOO
+CASTLING_MASK[4] &= ~(WHITE_OO | WHITE_OOO)
+CASTLING_MASK[7] &= ~WHITE_OO
+CASTLING_MASK[56] &= ~BLACK_OOO
+CASTLING_MASK[60] &= ~(BLACK_OO | BLACK_OOO)
+CASTLING_MASK[63] &= ~BLACK_OO
+
+KNIGHT_DELTAS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_DELTAS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+# Sliding directions, in pairs of opposite directions along one line
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (-1, -1), (1, -1), (-1, 1))
+
+
+
+def _leaper_attacks(deltas):
+    table = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        attacks = 0
+        for dr, df in deltas:
+            if 0 <= rank + dr < 8 and 0 <= file + df < 8:
+                attacks |= 1 << ((rank + dr) * 8 + file + df)
+        table.append(attacks)
+    return table
+
+
+# Attack sets of a knight, king or pawn standing on each square
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_DELTAS)
+KING_ATTACKS = _leaper_attacks(KING_DELTAS)
+PAWN_ATTACKS = (_leaper_attacks(((1, -1), (1, 1))), _leaper_attacks(((-1, -1), (-1, 1))))  # by color
+
+
+def _line_attacks(square, directions):
+    """Return the blocker mask of one line through square and its attacks for every blocker subset."""
+    rank, file = divmod(square, 8)
+    mask = 0
+    for dr, df in directions:
+        # The last square of a ray is attacked whether or not it is occupied
+        r, f = rank + dr, file + df
+        while 0 <= r + dr < 8 and 0 <= f + df < 8:
+            mask |= 1 << (r * 8 + f)
+            r += dr
+            f += df
+
+    attacks_by_blockers = {}
+    blockers = 0
+    while True:
+        attacks = 0
+        for dr, df in directions:
+            r, f = rank + dr, file + df
+            while 0 <= r < 8 and 0 <= f < 8:
+                attacks |= 1 << (r * 8 + f)
+                if blockers >> (r * 8 + f) & 1:
+                    break
+                r += dr
+                f += df
+        attacks_by_blockers[blockers] = attacks
+        # Step to the next subset of the mask (Carry-Rippler)
+        blockers = (blockers - mask) & mask
+        if not blockers:
+            return mask, attacks_by_blockers
+
+
+def _slider_attacks(directions):
+    masks = []
+    tables = []
+    for square in range(64):
+        first_mask, first = _line_attacks(square, directions[:2])
+        second_mask, second = _line_attacks(square, directions[2:])
+        masks.append(first_mask | second_mask)
+        tables.append({blockers | other_blockers: attacks | other_attacks
+                       for blockers, attacks in first.items()
+                       for other_blockers, other_attacks in second.items()})
+    return masks, tables
+
+
+# Sliding attacks are one lookup: each square has a table indexed by the occupancy of its
+# relevant squares (the rays minus the board edge), a perfect hash in the spirit of magic
+# bitboards that needs no multiply-and-shift
+ROOK_MASKS, ROOK_TABLES = _slider_attacks(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_TABLES = _slider_attacks(BISHOP_DIRECTIONS)
+
+
+def rook_attacks(square, occupied) -> int:
+    return ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+
+def bishop_attacks(square, occupied) -> int:
+    return BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+
+
+def queen_attacks(square, occupied) -> int:
+    return (ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+            | BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]])
+
+
+def _squares_between():
+    table = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        for dr, df in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            between = 0
+            r, f = rank + dr, file + df
+            while 0 <= r < 8 and 0 <= f < 8:
+                table[square][r * 8 + f] = between
+                between |= 1 << (r * 8 + f)
+                r += dr
+                f += df
+    return table
+
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Squares strictly between two squares on a shared line, zero when they are not aligned
+BETWEEN = _squares_between()
+
+# Zobrist keys, from a fixed seed so position hashes are stable between runs
+_zobrist_random = random.Random(0x2C0B1A57)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]  # by file
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Piece-square bonuses from white's point of view, written with rank 8 on top
+_PIECE_SQUARE_BONUS = (
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    (-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50),
+    (-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20),
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0),
+    (-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20),
+    (-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20),
+)
+
+# Material plus position for each piece code and square, positive for white
+PIECE_SQUARE = [[PIECE_VALUES[kind] + _PIECE_SQUARE_BONUS[kind][square ^ 56] for square in range(64)]
+                for kind in range(6)]
+PIECE_SQUARE += [[-PIECE_VALUES[kind] - _PIECE_SQUARE_BONUS[kind][square] for square in range(64)]
+                 for kind in range(6)]
+
+
+def encode_move(start, end, flags=QUIET) -> int:
+    return start | end << 6 | flags << 12
+
+
+def move_uci(move) -> str:
+    """Return the move in coordinate notation, e.g. 'e2e4' or 'e7e8q'."""
+    text = SQUARE_NAMES[move & 63] + SQUARE_NAMES[move >> 6 & 63]
+    if move >> 12 & PROMOTION:
+        text += "nbrq"[move >> 12 & 3]
+    return text
+
 
 class Spot:
+    __slots__ = ("_x", "_y", "_piece")
+
     def __init__(self, x, y, piece=None):
         self._x = x
         self._y = y
@@ -34,11 +262,38 @@ class Spot:
         self._y = y
 
 
+class BoardSpot(Spot):
+    """A Spot that reads and writes its piece through a bitboard Board."""
+
+    __slots__ = ("_board",)
+
+    def __init__(self, board, x, y):
+        super().__init__(x, y)
+        self._board = board
+
+    @property
+    def piece(self):
+        return self._board.squares[self._x * 8 + self._y]
+
+    @piece.setter
+    def piece(self, piece):
+        square = self._x * 8 + self._y
+        if self._board.squares[square] is not None:
+            self._board.remove_piece(square)
+        if piece is not None:
+            self._board.put_piece(square, piece)
+
 
 class Piece(ABC):
+    __slots__ = ("_white", "_killed", "color", "code")
+
+    kind = None  # type: Optional[int]
+
     def __init__(self, white: bool):
         self._white = white
         self._killed = False
+        self.color = WHITE if white else BLACK
+        self.code = self.kind + 6 * self.color
 
     @property
     def white(self) -> bool:
@@ -47,6 +302,8 @@ class Piece(ABC):
     @white.setter
     def white(self, value: bool):
         self._white = value
+        self.color = WHITE if value else BLACK
+        self.code = self.kind + 6 * self.color
 
     @property
     def killed(self) -> bool:
@@ -63,6 +320,10 @@ class Piece(ABC):
 
 
 class King(Piece):
+    __slots__ = ("_castling_done",)
+
+    kind = KING
+
     def __init__(self, white: bool):
         super().__init__(white)
         self._castling_done = False
@@ -80,32 +341,37 @@ class King(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
-        y = abs(start.y - end.y)
-        if x + y == 1:
+        # King steps one square in any direction
+        if KING_ATTACKS[start.x * 8 + start.y] >> (end.x * 8 + end.y) & 1:
             # In a full implementation, check if this move would put the king in check
             return True
 
         return self.is_valid_castling(board, start, end)
 
     def is_valid_castling(self, board, start, end) -> bool:
-        if self.castling_done:
+        if self.castling_done or not self.is_castling_move(start, end):
             return False
 
-        # Add detailed castling rules and return True if valid, False otherwise
-        # e.g. Rook hasn't moved, path is clear, king not in check etc.
-        return False  # Placeholder
+        # The board tracks castling rights and knows which squares are attacked
+        target = end.x * 8 + end.y
+        for move in board.legal_moves(self.white):
+            if move >> 6 & 63 == target and move >> 12 in (KING_CASTLE, QUEEN_CASTLE):
+                return True
+        return False
 
     def is_castling_move(self, start, end) -> bool:
-        # Example placeholder logic for castling move
-        # e.g. if king moves two squares horizontally on the same row
-        return start.y == end.y and abs(start.x - end.x) == 2
+        # The king moves two squares horizontally on the same row
+        return start.x == end.x and abs(start.y - end.y) == 2
     
     def __str__(self):
         return 'K' if self.white else 'k'
 
 
 class Knight(Piece):
+    __slots__ = ()
+
+    kind = KNIGHT
+
     def __init__(self, white: bool):
         super().__init__(white)
 
@@ -114,16 +380,17 @@ class Knight(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
-        y = abs(start.y - end.y)
-
-        # Knight moves in L-shape: x * y should equal 2
-        return x * y == 2
+        # Knight moves in L-shape, looked up in the precomputed attack table
+        return KNIGHT_ATTACKS[start.x * 8 + start.y] >> (end.x * 8 + end.y) & 1 == 1
     
     def __str__(self):
         return 'N' if self.white else 'n'
 
 class Bishop(Piece):
+    __slots__ = ()
+
+    kind = BISHOP
+
     def __init__(self, white: bool):
         super().__init__(white)
 
@@ -132,17 +399,19 @@ class Bishop(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
-        y = abs(start.y - end.y)
-
-        # Bishop moves diagonally: x and y should be equal
-        return x == y
+        # Bishop moves diagonally up to the first piece in the way
+        attacks = bishop_attacks(start.x * 8 + start.y, board.occupied)
+        return attacks >> (end.x * 8 + end.y) & 1 == 1
     
     def __str__(self):
-        return 'K' if self.white else 'k'
+        return 'B' if self.white else 'b'
     
 
 class Rook(Piece):
+    __slots__ = ()
+
+    kind = ROOK
+
     def __init__(self, white: bool):
         super().__init__(white)
 
@@ -151,17 +420,19 @@ class Rook(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
-        y = abs(start.y - end.y)
-    
-        # Rook moves horizontally or vertically: x or y should be 0
-        return x == 0 or y == 0
+        # Rook moves horizontally or vertically up to the first piece in the way
+        attacks = rook_attacks(start.x * 8 + start.y, board.occupied)
+        return attacks >> (end.x * 8 + end.y) & 1 == 1
     
     def __str__(self):
         return 'R' if self.white else 'r'
     
 
 class Queen(Piece):
+    __slots__ = ()
+
+    kind = QUEEN
+
     def __init__(self, white: bool):
         super().__init__(white)
 
@@ -170,17 +441,19 @@ class Queen(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
-        y = abs(start.y - end.y)
-
-        # Queen moves horizontally, vertically, or diagonally: x or y should be 0, or x and y should be equal
-        return x == 0 or y == 0 or x == y
+        # Queen moves horizontally, vertically, or diagonally up to the first piece in the way
+        attacks = queen_attacks(start.x * 8 + start.y, board.occupied)
+        return attacks >> (end.x * 8 + end.y) & 1 == 1
     
     def __str__(self):
         return 'Q' if self.white else 'q'
     
 
 class Pawn(Piece):
+    __slots__ = ()
+
+    kind = PAWN
+
     def __init__(self, white: bool):
         super().__init__(white)
 
@@ -189,11 +462,20 @@ class Pawn(Piece):
         if end.piece is not None and end.piece.white == self.white:
             return False
 
-        x = abs(start.x - end.x)
+        direction = 1 if self.white else -1
+        x = end.x - start.x
         y = abs(start.y - end.y)
 
-        # Pawn moves forward one step: x should be 0, y should be 1
-        return x == 0 and y == 1 
+        # Pawn moves forward one step, or two from its starting row over an empty square
+        if y == 0 and end.piece is None:
+            if x == direction:
+                return True
+            return (x == 2 * direction and start.x == (1 if self.white else 6)
+                    and board.get_box(start.x + direction, start.y).piece is None)
+
+        # Pawn captures one step diagonally forward, including en passant
+        return x == direction and y == 1 and (
+            end.piece is not None or end.x * 8 + end.y == board.ep_square)
 
     def __str__(self):
         return 'P' if self.white else 'p'
@@ -202,55 +484,1603 @@ class Pawn(Piece):
 
 
 class Board:
-    def __init__(self):
-        self.boxes = [[None for _ in range(8)] for _ in range(8)]
+    __slots__ = ("bitboards", "occupancy", "occupied", "squares", "white_to_move", "castling",
+                 "ep_square", "hash", "psq_score", "compact", "_moves", "_states", "_hashes",
+                 "_pieces", "_boxes")
+
+    def __init__(self, compact=False):
+        # A compact board shares one immutable-by-convention piece object per piece code
+        self.compact = compact
+        self.bitboards = [0] * 12  # one per piece code, see PIECE_SYMBOLS
+        self.occupancy = [0, 0]  # all white pieces, all black pieces
+        self.occupied = 0
+        self.squares = [None] * 64  # piece on each square, a1 = 0 ... h8 = 63
+        self.white_to_move = True
+        self.castling = ALL_CASTLING
+        self.ep_square = None  # square a pawn may capture onto en passant
+        self.hash = 0  # Zobrist key, kept up to date by every change to the board
+        self.psq_score = 0  # material and piece-square total, positive when white is better
+        self._boxes = None
         self.reset_board()
 
+    @property
+    def boxes(self):
+        # Spot views are only built for callers that still use the 8x8 grid
+        if self._boxes is None:
+            self._boxes = [[BoardSpot(self, x, y) for y in range(8)] for x in range(8)]
+        return self._boxes
+
     def get_box(self, x, y):
         if x < 0 or x > 7 or y < 0 or y > 7:
             raise IndexError("Index out of bounds")
         return self.boxes[x][y]
 
+    def piece_at(self, square):
+        return self.squares[square]
+
+    def pieces(self, kind, white) -> int:
+        return self.bitboards[kind if white else kind + 6]
+
+    def new_piece(self, code):
+        """Return a piece for a piece code: the shared instance on compact boards, else a new one."""
+        if self.compact:
+            return SHARED_PIECES[code]
+        return PIECE_CLASSES[code % 6](code < 6)
+
+    def put_piece(self, square, piece):
+        bit = 1 << square
+        self.squares[square] = piece
+        self.bitboards[piece.code] |= bit
+        self.occupancy[piece.color] |= bit
+        self.occupied |= bit
+        self.hash ^= ZOBRIST_PIECES[piece.code][square]
+        self.psq_score += PIECE_SQUARE[piece.code][square]
+
+    def remove_piece(self, square):
+        piece = self.squares[square]
+        if piece is None:
+            return None
+        mask = ~(1 << square)
+        self.squares[square] = None
+        self.bitboards[piece.code] &= mask
+        self.occupancy[piece.color] &= mask
+        self.occupied &= mask
+        self.hash ^= ZOBRIST_PIECES[piece.code][square]
+        self.psq_score -= PIECE_SQUARE[piece.code][square]
+        return piece
+
+    def move_piece(self, start, end):
+        """Move the piece on square start to square end and return any captured piece."""
+        captured = self.remove_piece(end)
+        self.put_piece(end, self.remove_piece(start))
+        return captured
+
+    def clear(self):
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.squares = [None] * 64
+        self.white_to_move = True
+        self.castling = 0
+        self.ep_square = None
+        self.hash = ZOBRIST_CASTLING[0]
+        self.psq_score = 0
+        # The undo stack of make_move, one entry per ply in each array: the move,
+        # its packed state (see _pack_state) and the hash before it. Compact boards
+        # recover piece objects from their codes; other boards also keep the moved
+        # and captured piece objects, two per ply, since games track their state.
+        self._moves = array("H")
+        self._states = array("I")
+        self._hashes = array("Q")
+        self._pieces = None if self.compact else []
+
     def reset_board(self):
-        # Initialize white pieces
-        self.boxes[0][0] = Spot(0, 0, Rook(True))
-        self.boxes[0][1] = Spot(0, 1, Knight(True))
-        self.boxes[0][2] = Spot(0, 2, Bishop(True))
-        self.boxes[0][3] = Spot(0, 3, Queen(True))
-        self.boxes[0][4] = Spot(0, 4, King(True))
-        self.boxes[0][5] = Spot(0, 5, Bishop(True))
-        self.boxes[0][6] = Spot(0, 6, Knight(True))
-        self.boxes[0][7] = Spot(0, 7, Rook(True))
+        self.clear()
+        self.castling = ALL_CASTLING
+        self.hash ^= ZOBRIST_CASTLING[0] ^ ZOBRIST_CASTLING[ALL_CASTLING]
+
+        # Initialize white and black pieces
+        back_rank = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+        for j, kind in enumerate(back_rank):
+            self.put_piece(j, self.new_piece(kind))
+            self.put_piece(56 + j, self.new_piece(kind + 6))
         for j in range(8):
-            self.boxes[1][j] = Spot(1, j, Pawn(True))
-
-        # Initialize black pieces
-        self.boxes[7][0] = Spot(7, 0, Rook(False))
-        self.boxes[7][1] = Spot(7, 1, Knight(False))
-        self.boxes[7][2] = Spot(7, 2, Bishop(False))
-        self.boxes[7][3] = Spot(7, 3, Queen(False))
-        self.boxes[7][4] = Spot(7, 4, King(False))
-        self.boxes[7][5] = Spot(7, 5, Bishop(False))
-        self.boxes[7][6] = Spot(7, 6, Knight(False))
-        self.boxes[7][7] = Spot(7, 7, Rook(False))
-        for j in range(8):
-            self.boxes[6][j] = Spot(6, j, Pawn(False))
+            self.put_piece(8 + j, self.new_piece(PAWN))
+            self.put_piece(48 + j, self.new_piece(PAWN + 6))
+
+    def copy(self):
+        """Return an independent board in the same position, sharing the piece objects."""
+        board = Board.__new__(Board)
+        board.compact = self.compact
+        board.bitboards = self.bitboards[:]
+        board.occupancy = self.occupancy[:]
+        board.occupied = self.occupied
+        board.squares = self.squares[:]
+        board.white_to_move = self.white_to_move
+        board.castling = self.castling
+        board.ep_square = self.ep_square
+        board.hash = self.hash
+        board.psq_score = self.psq_score
+        board._moves = self._moves[:]
+        board._states = self._states[:]
+        board._hashes = self._hashes[:]
+        board._pieces = None if self._pieces is None else self._pieces[:]
+        board._boxes = None
+        return board
+
+    def _pack_state(self, piece, captured):
+        # Castling rights in bits 0-3, then each of the en passant square, the
+        # moved piece code and the captured piece code plus one, zero for none
+        state = self.castling
+        if self.ep_square is not None:
+            state |= (self.ep_square + 1) << 4
+        if piece is not None:
+            state |= (piece.code + 1) << 11
+        if captured is not None:
+            state |= (captured.code + 1) << 15
+        return state
+
+    def played_move(self, index):
+        """Return (move, piece moved, piece captured) for a move still on the undo stack."""
+        move = self._moves[index]
+        if self._pieces is not None:
+            if index < 0:
+                index += len(self._moves)
+            return move, self._pieces[2 * index], self._pieces[2 * index + 1]
+        state = self._states[index]
+        captured = state >> 15 & 15
+        return move, SHARED_PIECES[(state >> 11 & 15) - 1], SHARED_PIECES[captured - 1] if captured else None
+
+    def compute_hash(self) -> int:
+        """Compute the Zobrist key from scratch; make_move keeps self.hash equal to this."""
+        key = ZOBRIST_CASTLING[self.castling]
+        for square, piece in enumerate(self.squares):
+            if piece is not None:
+                key ^= ZOBRIST_PIECES[piece.code][square]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key
+
+    def is_square_attacked(self, square, by_white, occupied=None) -> bool:
+        """Return True if a piece of the given side attacks square.
+
+        occupied overrides the board occupancy seen by sliding pieces, e.g. to
+        look through a king that is about to move.
+        """
+        bitboards = self.bitboards
+        offset = 0 if by_white else 6
+
+        # A square is attacked by a pawn or knight exactly when that piece, standing on
+        # the square, would attack the attacker back
+        if PAWN_ATTACKS[1 if by_white else 0][square] & bitboards[PAWN + offset]:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[KNIGHT + offset]:
+            return True
+        if KING_ATTACKS[square] & bitboards[KING + offset]:
+            return True
 
-        # Initialize empty boxes
-        for i in range(2, 6):
-            for j in range(8):
-                self.boxes[i][j] = Spot(i, j, None)
+        if occupied is None:
+            occupied = self.occupied
+        queens = bitboards[QUEEN + offset]
+        if ROOK_TABLES[square][occupied & ROOK_MASKS[square]] & (bitboards[ROOK + offset] | queens):
+            return True
+        return bool(BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+                    & (bitboards[BISHOP + offset] | queens))
+
+    def king_square(self, white) -> int:
+        king = self.bitboards[KING if white else KING + 6]
+        return (king & -king).bit_length() - 1
+
+    def is_check(self, white=None) -> bool:
+        if white is None:
+            white = self.white_to_move
+        return self.is_square_attacked(self.king_square(white), not white)
+
+    def last_move_checks(self) -> bool:
+        """Return True if the move just played with make_move gives check.
+
+        Only the moved piece (or the castled rook) can check directly, and a
+        discovered check needs a slider on a line through a vacated square, so
+        a handful of lookups replace testing every piece of the mover.
+        """
+        if not self._moves:
+            return self.is_check()
+        white = self.white_to_move  # the side that may now be in check
+        king = self.bitboards[KING if white else KING + 6]
+        if not king:
+            return False
+        king_square = king.bit_length() - 1
+        move = self._moves[-1]
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        occupied = self.occupied
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            return bool(rook_attacks(end - 1 if flags == KING_CASTLE else end + 1, occupied) & king)
+
+        piece = self.squares[end]
+        kind = piece.kind
+        if kind == PAWN:
+            attacks = PAWN_ATTACKS[piece.color][end]
+        elif kind == KNIGHT:
+            attacks = KNIGHT_ATTACKS[end]
+        elif kind == BISHOP:
+            attacks = bishop_attacks(end, occupied)
+        elif kind == ROOK:
+            attacks = rook_attacks(end, occupied)
+        elif kind == QUEEN:
+            attacks = queen_attacks(end, occupied)
+        else:
+            attacks = 0
+        if attacks & king:
+            return True
+
+        offset = 6 if white else 0  # the mover's pieces
+        queens = self.bitboards[QUEEN + offset]
+        vacated = (start, end + 8 if white else end - 8) if flags == EP_CAPTURE else (start,)
+        for square in vacated:
+            if square >> 3 == king_square >> 3 or square & 7 == king_square & 7:
+                if rook_attacks(king_square, occupied) & (self.bitboards[ROOK + offset] | queens):
+                    return True
+            elif abs((square >> 3) - (king_square >> 3)) == abs((square & 7) - (king_square & 7)):
+                if bishop_attacks(king_square, occupied) & (self.bitboards[BISHOP + offset] | queens):
+                    return True
+        return False
+
+    def has_legal_move(self) -> bool:
+        """Return True if the side to move has any legal move.
+
+        Uses the same check mask and pin rays as legal_moves, but stops at the
+        first piece with a legal target instead of generating every move.
+        """
+        white = self.white_to_move
+        color = WHITE if white else BLACK
+        offset = 6 * color
+        bitboards = self.bitboards
+        king = bitboards[KING + offset]
+        if not king:
+            return bool(self.pseudo_legal_moves(white))
+        own = self.occupancy[color]
+        occupied = self.occupied
+        king_square = king.bit_length() - 1
+
+        # A king step to a safe square is the cheapest legal move to find; the king
+        # is taken off the board so it cannot hide behind itself from a slider.
+        # Castling needs the first step to be safe too, so it is covered here.
+        targets = KING_ATTACKS[king_square] & ~own
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            if not self.is_square_attacked(low.bit_length() - 1, not white, occupied ^ king):
+                return True
+
+        checkers, pinned, pin_rays = self._checkers_and_pins(color, king_square)
+        if checkers & (checkers - 1):
+            return False
+        if checkers:
+            allowed = (checkers | BETWEEN[king_square][checkers.bit_length() - 1]) & ~own
+        else:
+            allowed = ~own & ALL_SQUARES
+
+        pieces = bitboards[KNIGHT + offset] & ~pinned
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            if KNIGHT_ATTACKS[low.bit_length() - 1] & allowed:
+                return True
+
+        queens = bitboards[QUEEN + offset]
+        for masks, tables, pieces in ((ROOK_MASKS, ROOK_TABLES, bitboards[ROOK + offset] | queens),
+                                      (BISHOP_MASKS, BISHOP_TABLES, bitboards[BISHOP + offset] | queens)):
+            while pieces:
+                low = pieces & -pieces
+                start = low.bit_length() - 1
+                pieces ^= low
+                targets = tables[start][occupied & masks[start]] & allowed
+                if pinned & low:
+                    targets &= pin_rays[start]
+                if targets:
+                    return True
+
+        squares = self.squares
+        enemy = self.occupancy[color ^ 1]
+        pawn_attacks = PAWN_ATTACKS[color]
+        forward = 8 if white else -8
+        double_rank = 1 if white else 6
+        ep_square = self.ep_square
+        pieces = bitboards[PAWN + offset]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            pieces ^= low
+            targets = allowed & pin_rays[start] if pinned & low else allowed
+            if targets & pawn_attacks[start] & enemy:
+                return True
+            end = start + forward
+            if squares[end] is None and (targets >> end & 1 or (
+                    start >> 3 == double_rank and squares[end + forward] is None
+                    and targets >> (end + forward) & 1)):
+                return True
+            if ep_square is not None and pawn_attacks[start] >> ep_square & 1:
+                self.make_move(start | ep_square << 6 | EP_CAPTURE << 12)
+                legal = not self.is_square_attacked(king_square, not white)
+                self.unmake_move()
+                if legal:
+                    return True
+        return False
+
+    def _checkers_and_pins(self, color, king_square):
+        """Return the pieces checking color's king, the pinned pieces, and a ray per pinned square.
+
+        A piece is pinned when it is the only one between its king and an
+        enemy slider; its ray runs from the king to the pinner, inclusive.
+        """
+        bitboards = self.bitboards
+        enemy_offset = 6 - 6 * color
+        enemy = self.occupancy[color ^ 1]
+        occupied = self.occupied
+        enemy_queens = bitboards[QUEEN + enemy_offset]
+        enemy_rooks = bitboards[ROOK + enemy_offset] | enemy_queens
+        enemy_bishops = bitboards[BISHOP + enemy_offset] | enemy_queens
+        checkers = ((PAWN_ATTACKS[color][king_square] & bitboards[PAWN + enemy_offset])
+                    | (KNIGHT_ATTACKS[king_square] & bitboards[KNIGHT + enemy_offset])
+                    | (ROOK_TABLES[king_square][occupied & ROOK_MASKS[king_square]] & enemy_rooks)
+                    | (BISHOP_TABLES[king_square][occupied & BISHOP_MASKS[king_square]] & enemy_bishops))
+        pinned = 0
+        pin_rays = {}
+        for attacks, sliders in ((ROOK_TABLES[king_square][enemy & ROOK_MASKS[king_square]], enemy_rooks),
+                                 (BISHOP_TABLES[king_square][enemy & BISHOP_MASKS[king_square]], enemy_bishops)):
+            pinners = attacks & sliders
+            while pinners:
+                low = pinners & -pinners
+                pinners ^= low
+                ray = BETWEEN[king_square][low.bit_length() - 1]
+                blockers = ray & occupied
+                if blockers and not blockers & (blockers - 1):
+                    pinned |= blockers
+                    pin_rays[blockers.bit_length() - 1] = ray | low
+        return checkers, pinned, pin_rays
+
+    def pseudo_legal_moves(self, white=None):
+        """Return the moves for one side that obey piece movement, ignoring king safety."""
+        if white is None:
+            white = self.white_to_move
+        moves = []
+        append = moves.append
+        bitboards = self.bitboards
+        squares = self.squares
+        color = WHITE if white else BLACK
+        offset = 6 * color
+        own = self.occupancy[color]
+        enemy = self.occupancy[color ^ 1]
+        not_own = ~own
+        ep_square = self.ep_square if white == self.white_to_move else None
+
+        pawn_attacks = PAWN_ATTACKS[color]
+        forward = 8 if white else -8
+        double_rank, last_rank = (1, 7) if white else (6, 0)
+        pieces = bitboards[PAWN + offset]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            pieces ^= low
+            end = start + forward
+            if squares[end] is None:
+                if end >> 3 == last_rank:
+                    for promotion in range(4):
+                        append(start | end << 6 | (PROMOTION | promotion) << 12)
+                else:
+                    append(start | end << 6)
+                    if start >> 3 == double_rank and squares[end + forward] is None:
+                        append(start | (end + forward) << 6 | DOUBLE_PUSH << 12)
+            targets = pawn_attacks[start] & enemy
+            while targets:
+                low = targets & -targets
+                end = low.bit_length() - 1
+                targets ^= low
+                if end >> 3 == last_rank:
+                    for promotion in range(4):
+                        append(start | end << 6 | (PROMOTION | CAPTURE | promotion) << 12)
+                else:
+                    append(start | end << 6 | CAPTURE << 12)
+            if ep_square is not None and pawn_attacks[start] >> ep_square & 1:
+                append(start | ep_square << 6 | EP_CAPTURE << 12)
+
+        for table, pieces in ((KNIGHT_ATTACKS, bitboards[KNIGHT + offset]),
+                              (KING_ATTACKS, bitboards[KING + offset])):
+            while pieces:
+                low = pieces & -pieces
+                start = low.bit_length() - 1
+                pieces ^= low
+                targets = table[start] & not_own
+                while targets:
+                    low = targets & -targets
+                    end = low.bit_length() - 1
+                    targets ^= low
+                    append(start | end << 6 | (CAPTURE << 12 if enemy & low else 0))
+
+        occupied = self.occupied
+        queens = bitboards[QUEEN + offset]
+        for masks, tables, pieces in ((ROOK_MASKS, ROOK_TABLES, bitboards[ROOK + offset] | queens),
+                                      (BISHOP_MASKS, BISHOP_TABLES, bitboards[BISHOP + offset] | queens)):
+            while pieces:
+                low = pieces & -pieces
+                start = low.bit_length() - 1
+                pieces ^= low
+                targets = tables[start][occupied & masks[start]] & not_own
+                while targets:
+                    low = targets & -targets
+                    end = low.bit_length() - 1
+                    targets ^= low
+                    append(start | end << 6 | (CAPTURE << 12 if enemy & low else 0))
+
+        king = bitboards[KING + offset]
+        if king:
+            self._add_castling_moves(white, king.bit_length() - 1, append)
+        return moves
+
+    def _add_castling_moves(self, white, start, append):
+        if white:
+            rights, home, rooks = self.castling & (WHITE_OO | WHITE_OOO), 4, self.bitboards[ROOK]
+        else:
+            rights, home, rooks = self.castling & (BLACK_OO | BLACK_OOO), 60, self.bitboards[ROOK + 6]
+        if not rights or start != home:
+            return
+        occupied = self.occupied
+        attacked = self.is_square_attacked
+        if (rights & (WHITE_OO | BLACK_OO) and rooks >> (home + 3) & 1
+                and not occupied & (3 << (home + 1))
+                and not attacked(home, not white) and not attacked(home + 1, not white)
+                and not attacked(home + 2, not white)):
+            append(home | (home + 2) << 6 | KING_CASTLE << 12)
+        if (rights & (WHITE_OOO | BLACK_OOO) and rooks >> (home - 4) & 1
+                and not occupied & (7 << (home - 3))
+                and not attacked(home, not white) and not attacked(home - 1, not white)
+                and not attacked(home - 2, not white)):
+            append(home | (home - 2) << 6 | QUEEN_CASTLE << 12)
+
+    def legal_moves(self, white=None, captures=False):
+        """Yield every legal move for one side, by default the side to move.
+
+        With captures=True only captures and promotions are generated, as
+        quiescence search needs.
+
+        Moves are encoded ints (see encode_move). Checking pieces and pins are
+        found once per position, giving a mask of squares that block or capture
+        the checker and a ray for each pinned piece, so moves are filtered with
+        a few ANDs instead of being played and taken back. Only en passant,
+        which can uncover a check along the rank, is still verified by playing it.
+        """
+        if white is None:
+            white = self.white_to_move
+        bitboards = self.bitboards
+        color = WHITE if white else BLACK
+        offset = 6 * color
+        king = bitboards[KING + offset]
+        if not king:
+            yield from self.pseudo_legal_moves(white)
+            return
+
+        moves = []
+        append = moves.append
+        squares = self.squares
+        own = self.occupancy[color]
+        enemy = self.occupancy[color ^ 1]
+        not_own = ~own
+        occupied = self.occupied
+        king_square = king.bit_length() - 1
+        checkers, pinned, pin_rays = self._checkers_and_pins(color, king_square)
+
+        # The king is lifted off the board so it cannot hide behind itself from a slider
+        is_attacked = self.is_square_attacked
+        without_king = occupied ^ king
+        targets = KING_ATTACKS[king_square] & (enemy if captures else not_own)
+        while targets:
+            low = targets & -targets
+            end = low.bit_length() - 1
+            targets ^= low
+            if not is_attacked(end, not white, without_king):
+                append(king_square | end << 6 | (CAPTURE << 12 if enemy & low else 0))
+
+        if checkers & (checkers - 1):
+            # Double check: only the king can move
+            yield from moves
+            return
+        if checkers:
+            checker_square = checkers.bit_length() - 1
+            allowed = (checkers | BETWEEN[king_square][checker_square]) & not_own
+        else:
+            allowed = not_own & ALL_SQUARES
+            if not captures:
+                self._add_castling_moves(white, king_square, append)
+
+        pawn_attacks = PAWN_ATTACKS[color]
+        forward = 8 if white else -8
+        double_rank, last_rank = (1, 7) if white else (6, 0)
+        ep_square = self.ep_square if white == self.white_to_move else None
+        pieces = bitboards[PAWN + offset]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            pieces ^= low
+            targets = allowed & pin_rays[start] if pinned & low else allowed
+            end = start + forward
+            if squares[end] is None and (not captures or end >> 3 == last_rank):
+                if targets >> end & 1:
+                    if end >> 3 == last_rank:
+                        for promotion in range(4):
+                            append(start | end << 6 | (PROMOTION | promotion) << 12)
+                    else:
+                        append(start | end << 6)
+                if (start >> 3 == double_rank and squares[end + forward] is None
+                        and targets >> (end + forward) & 1):
+                    append(start | (end + forward) << 6 | DOUBLE_PUSH << 12)
+            if ep_square is not None and pawn_attacks[start] >> ep_square & 1:
+                move = start | ep_square << 6 | EP_CAPTURE << 12
+                self.make_move(move)
+                if not is_attacked(king_square, not white):
+                    append(move)
+                self.unmake_move()
+            targets &= pawn_attacks[start] & enemy
+            while targets:
+                low = targets & -targets
+                end = low.bit_length() - 1
+                targets ^= low
+                if end >> 3 == last_rank:
+                    for promotion in range(4):
+                        append(start | end << 6 | (PROMOTION | CAPTURE | promotion) << 12)
+                else:
+                    append(start | end << 6 | CAPTURE << 12)
+
+        if captures:
+            allowed &= enemy
+        # A pinned knight can never move along the pin
+        pieces = bitboards[KNIGHT + offset] & ~pinned
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            pieces ^= low
+            targets = KNIGHT_ATTACKS[start] & allowed
+            while targets:
+                low = targets & -targets
+                end = low.bit_length() - 1
+                targets ^= low
+                append(start | end << 6 | (CAPTURE << 12 if enemy & low else 0))
+
+        queens = bitboards[QUEEN + offset]
+        for masks, tables, pieces in ((ROOK_MASKS, ROOK_TABLES, bitboards[ROOK + offset] | queens),
+                                      (BISHOP_MASKS, BISHOP_TABLES, bitboards[BISHOP + offset] | queens)):
+            while pieces:
+                low = pieces & -pieces
+                start = low.bit_length() - 1
+                pieces ^= low
+                targets = tables[start][occupied & masks[start]] & allowed
+                if pinned & low:
+                    targets &= pin_rays[start]
+                while targets:
+                    low = targets & -targets
+                    end = low.bit_length() - 1
+                    targets ^= low
+                    append(start | end << 6 | (CAPTURE << 12 if enemy & low else 0))
+
+        yield from moves
+
+    def attackers_to(self, square, occupied=None) -> int:
+        """Return the bitboard of pieces of both colors that attack square.
+
+        occupied overrides the board occupancy, so pieces removed from it stop
+        attacking and sliders see through them.
+        """
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.bitboards
+        queens = bitboards[QUEEN] | bitboards[QUEEN + 6]
+        return ((PAWN_ATTACKS[BLACK][square] & bitboards[PAWN])
+                | (PAWN_ATTACKS[WHITE][square] & bitboards[PAWN + 6])
+                | (KNIGHT_ATTACKS[square] & (bitboards[KNIGHT] | bitboards[KNIGHT + 6]))
+                | (KING_ATTACKS[square] & (bitboards[KING] | bitboards[KING + 6]))
+                | (ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+                   & (bitboards[ROOK] | bitboards[ROOK + 6] | queens))
+                | (BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+                   & (bitboards[BISHOP] | bitboards[BISHOP + 6] | queens))) & occupied
+
+    def see(self, move) -> int:
+        """Static exchange evaluation: the material the side to move wins with move.
+
+        Both sides keep recapturing on the target square with their least
+        valuable attacker, and either may stop when going on would lose
+        material. Sliders behind a capturing piece join in as it leaves.
+        """
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        squares = self.squares
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        occupied = self.occupied ^ (1 << start)
+        piece_value = PIECE_VALUES[squares[start].kind]
+        if flags == EP_CAPTURE:
+            gain = PIECE_VALUES[PAWN]
+            occupied ^= 1 << (end - 8 if self.white_to_move else end + 8)
+        elif flags & CAPTURE:
+            gain = PIECE_VALUES[squares[end].kind]
+        else:
+            gain = 0
+        if flags & PROMOTION:
+            piece_value = PIECE_VALUES[KNIGHT + (flags & 3)]
+            gain += piece_value - PIECE_VALUES[PAWN]
+
+        gains = [gain]
+        color = BLACK if self.white_to_move else WHITE
+        attackers = self.attackers_to(end, occupied)
+        while True:
+            own = attackers & occupancy[color]
+            if not own:
+                break
+            offset = 6 * color
+            for kind in range(6):
+                candidates = own & bitboards[kind + offset]
+                if candidates:
+                    break
+            if kind == KING and attackers & occupancy[color ^ 1]:
+                break  # the king cannot capture onto a defended square
+            gains.append(piece_value - gains[-1])
+            piece_value = PIECE_VALUES[kind]
+            occupied ^= candidates & -candidates
+            attackers = self.attackers_to(end, occupied)
+            color ^= 1
+
+        # Each side only recaptures when that does not lose material
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def find_move(self, start, end, promotion=None):
+        """Return the legal move from square start to square end, or None."""
+        if promotion is None:
+            promotion = QUEEN
+        for move in self.legal_moves():
+            if move & 63 == start and move >> 6 & 63 == end:
+                flags = move >> 12
+                if not flags & PROMOTION or (flags & 3) + KNIGHT == promotion:
+                    return move
+        return None
+
+    def parse_uci(self, text):
+        """Return the legal move for coordinate notation such as 'e2e4' or 'e7e8q', or None."""
+        if len(text) not in (4, 5) or text[:2] not in SQUARE_INDEX or text[2:4] not in SQUARE_INDEX:
+            return None
+        promotion = None
+        if len(text) == 5:
+            if text[4] not in "nbrq":
+                return None
+            promotion = KNIGHT + "nbrq".index(text[4])
+        return self.find_move(SQUARE_INDEX[text[:2]], SQUARE_INDEX[text[2:4]], promotion)
+
+    def make_move(self, move):
+        """Play an encoded move in place and return the captured piece, if any."""
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        previous_hash = self.hash
+        piece = self.remove_piece(start)
+        captured = None
+        if flags == EP_CAPTURE:
+            captured = self.remove_piece(end - 8 if piece.white else end + 8)
+        elif flags & CAPTURE:
+            captured = self.remove_piece(end)
+
+        if flags & PROMOTION:
+            self.put_piece(end, self.new_piece(KNIGHT + (flags & 3) + 6 * piece.color))
+        else:
+            self.put_piece(end, piece)
+        if flags == KING_CASTLE:
+            self.put_piece(end - 1, self.remove_piece(end + 1))
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(end + 1, self.remove_piece(end - 2))
+
+        self._moves.append(move)
+        self._states.append(self._pack_state(piece, captured))
+        self._hashes.append(previous_hash)
+        if self._pieces is not None:
+            self._pieces += (piece, captured)
+        key = self.hash ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[self.castling]
+        self.castling &= CASTLING_MASK[start] & CASTLING_MASK[end]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+        # The en passant square only counts, in the hash and for repetitions, when an
+        # enemy pawn stands beside the pushed pawn to capture it
+        if flags == DOUBLE_PUSH and (PAWN_ATTACKS[piece.color][(start + end) >> 1]
+                                     & self.bitboards[PAWN + 6 - 6 * piece.color]):
+            self.ep_square = (start + end) >> 1
+            key ^= ZOBRIST_EP[start & 7]
+        else:
+            self.ep_square = None
+        self.hash = key
+        self.white_to_move = not self.white_to_move
+        return captured
+
+    def unmake_move(self):
+        """Take back the last move played with make_move and return it."""
+        move = self._moves.pop()
+        state = self._states.pop()
+        key = self._hashes.pop()
+        self.castling = state & 15
+        self.ep_square = (state >> 4 & 127) - 1 if state & 0x7F0 else None
+        if self._pieces is None:
+            piece = SHARED_PIECES[(state >> 11 & 15) - 1]
+            captured = SHARED_PIECES[(state >> 15) - 1] if state >> 15 else None
+        else:
+            captured = self._pieces.pop()
+            piece = self._pieces.pop()
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+
+        self.remove_piece(end)
+        self.put_piece(start, piece)
+        if flags == EP_CAPTURE:
+            self.put_piece(end - 8 if piece.white else end + 8, captured)
+        elif captured is not None:
+            self.put_piece(end, captured)
+        if flags == KING_CASTLE:
+            self.put_piece(end + 1, self.remove_piece(end - 1))
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(end - 2, self.remove_piece(end + 1))
+
+        self.hash = key
+        self.white_to_move = not self.white_to_move
+        return move
+
+    def make_null_move(self):
+        """Pass the turn without moving, for null-move pruning; undo with unmake_null_move()."""
+        self._moves.append(0)
+        self._states.append(self._pack_state(None, None))
+        self._hashes.append(self.hash)
+        if self._pieces is not None:
+            self._pieces += (None, None)
+        key = self.hash ^ ZOBRIST_BLACK_TO_MOVE
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP[self.ep_square & 7]
+            self.ep_square = None
+        self.hash = key
+        self.white_to_move = not self.white_to_move
+
+    def unmake_null_move(self):
+        self._moves.pop()
+        state = self._states.pop()
+        self.hash = self._hashes.pop()
+        self.castling = state & 15
+        self.ep_square = (state >> 4 & 127) - 1 if state & 0x7F0 else None
+        if self._pieces is not None:
+            del self._pieces[-2:]
+        self.white_to_move = not self.white_to_move
+
+    @classmethod
+    def from_fen(cls, fen, compact=False):
+        board = cls.__new__(cls)
+        board.compact = compact
+        board._boxes = None
+        board.set_fen(fen)
+        return board
+
+    def set_fen(self, fen):
+        """Set up the position described by a FEN string in a single pass.
+
+        Every field is checked before the board changes, so a ValueError
+        leaves the current position untouched. The move counters are not
+        board state; Game.load_fen reads those.
+        """
+        fields = fen.split()
+        if not fields:
+            raise ValueError("Empty FEN")
+        placement = []  # (square, piece code) pairs
+        square = 56
+        file = 0
+        ranks = 1
+        for char in fields[0]:
+            if char == "/":
+                if file != 8 or ranks == 8:
+                    raise ValueError("Invalid FEN piece placement: %r" % fields[0])
+                square -= 16
+                file = 0
+                ranks += 1
+            elif char in _FEN_EMPTY_SQUARES and file + _FEN_EMPTY_SQUARES[char] <= 8:
+                square += _FEN_EMPTY_SQUARES[char]
+                file += _FEN_EMPTY_SQUARES[char]
+            elif char in _FEN_PIECES and file < 8:
+                placement.append((square, _FEN_PIECES[char]))
+                square += 1
+                file += 1
+            else:
+                raise ValueError("Invalid FEN piece placement: %r" % fields[0])
+        if file != 8 or ranks != 8:
+            raise ValueError("Invalid FEN piece placement: %r" % fields[0])
+
+        if len(fields) > 1 and fields[1] not in ("w", "b"):
+            raise ValueError("Invalid FEN side to move: %r" % fields[1])
+        white_to_move = len(fields) < 2 or fields[1] == "w"
+        castling = 0
+        if len(fields) > 2 and fields[2] != "-":
+            for char in fields[2]:
+                if char not in _FEN_CASTLING:
+                    raise ValueError("Invalid FEN castling rights: %r" % fields[2])
+                castling |= _FEN_CASTLING[char]
+        ep_square = None
+        if len(fields) > 3 and fields[3] != "-":
+            # The square a pawn just skipped: rank 6 with white to move, rank 3 with black
+            ep_rank = 5 if white_to_move else 2
+            if fields[3] not in SQUARE_INDEX or SQUARE_INDEX[fields[3]] >> 3 != ep_rank:
+                raise ValueError("Invalid FEN en passant square: %r" % fields[3])
+            ep_square = SQUARE_INDEX[fields[3]]
+
+        self.clear()
+        put_piece = self.put_piece
+        new_piece = self.new_piece
+        for square, code in placement:
+            put_piece(square, new_piece(code))
+        key = self.hash
+        if not white_to_move:
+            self.white_to_move = False
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if castling:
+            self.castling = castling
+            key ^= ZOBRIST_CASTLING[0] ^ ZOBRIST_CASTLING[castling]
+        if ep_square is not None:
+            # Kept only if a pawn of the side to move can capture there, as in make_move
+            if white_to_move:
+                capturers = PAWN_ATTACKS[BLACK][ep_square] & self.bitboards[PAWN]
+            else:
+                capturers = PAWN_ATTACKS[WHITE][ep_square] & self.bitboards[PAWN + 6]
+            if capturers:
+                self.ep_square = ep_square
+                key ^= ZOBRIST_EP[ep_square & 7]
+        self.hash = key
+
+    def to_fen(self, halfmove_clock=0, fullmove_number=1) -> str:
+        squares = self.squares
+        rows = []
+        for rank_start in range(56, -1, -8):
+            row = ""
+            empty = 0
+            for square in range(rank_start, rank_start + 8):
+                piece = squares[square]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += PIECE_SYMBOLS[piece.code]
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = "".join(char for char, right in _FEN_CASTLING.items() if self.castling & right)
+        return "%s %s %s %s %d %d" % (
+            "/".join(rows), "w" if self.white_to_move else "b", castling or "-",
+            "-" if self.ep_square is None else SQUARE_NAMES[self.ep_square],
+            halfmove_clock, fullmove_number)
+
+    def perft(self, depth) -> int:
+        """Count the leaf nodes of the legal move tree to the given depth."""
+        if depth == 0:
+            return 1
+        if depth == 1:
+            return sum(1 for _ in self.legal_moves())
+        nodes = 0
+        for move in self.legal_moves():
+            self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.unmake_move()
+        return nodes
+
+    def divide(self, depth):
+        """Return the perft count below each legal root move, keyed by the move in UCI notation."""
+        counts = {}
+        for move in self.legal_moves():
+            self.make_move(move)
+            counts[move_uci(move)] = self.perft(depth - 1)
+            self.unmake_move()
+        return counts
 
     def print_board(self):
         print("  a b c d e f g h")
         for i in range(7, -1, -1):
             print(i + 1, end=' ')
             for j in range(8):
-                piece = self.boxes[i][j].piece
-                print(str(piece) if piece else '.', end=' ')
+                piece = self.squares[i * 8 + j]
+                print(PIECE_SYMBOLS[piece.code] if piece else '.', end=' ')
             print()
         print()
 
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+# One piece per piece code, shared by every compact Board
+SHARED_PIECES = tuple(PIECE_CLASSES[code % 6](code < 6) for code in range(12))
+
+_FEN_PIECES = {symbol: code for code, symbol in enumerate(PIECE_SYMBOLS)}
+_FEN_EMPTY_SQUARES = {str(count): count for count in range(1, 9)}
+_FEN_CASTLING = {"K": WHITE_OO, "Q": WHITE_OOO, "k": BLACK_OO, "q": BLACK_OOO}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Standard perft positions with their known node counts from depth 1 upwards
+PERFT_POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 64
+# Quiescence skips a capture that cannot lift the score to alpha even with this much to spare
+DELTA_MARGIN = 200
+# Quiet moves are skipped at depth 1 and 2 when the static evaluation is this far below alpha
+FUTILITY_MARGINS = (0, 200, 350)
+# A node at depth 3 or less fails high without searching when the evaluation beats beta by this per ply
+REVERSE_FUTILITY_MARGIN = 120
+NULL_MOVE_MIN_DEPTH = 3
+ASPIRATION_WINDOW = 50
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # moves searched at full depth before late ones are reduced
+# Plies to reduce the nth move searched at a given depth: LMR_REDUCTIONS[depth][n]
+LMR_REDUCTIONS = tuple(
+    tuple(int(0.75 + math.log(depth) * math.log(number) / 2.25) if depth and number else 0
+          for number in range(64))
+    for depth in range(MAX_PLY + 1))
+
+
+# Transposition table bound types; zero marks an empty entry
+LOWER_BOUND, UPPER_BOUND, EXACT = 1, 2, 3
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by Zobrist hash.
+
+    Memory is allocated once, as two arrays of 64-bit words: the position keys
+    and the packed entry data (move, depth, bound, age and score). Each bucket
+    holds two entries, one that keeps the deepest recent search and one that is
+    always replaced.
+
+    Given a buffer, such as a multiprocessing.shared_memory block of
+    buffer_size(size_mb) bytes, the table lives in it and can be shared by
+    processes without locks: an entry's key is stored XORed with its data, so
+    an entry torn by two processes writing at once fails the key check.
+    """
+
+    ENTRY_BYTES = 16
+
+    def __init__(self, size_mb=16, buffer=None):
+        buckets = self._buckets(size_mb)
+        self.mask = buckets - 1
+        if buffer is None:
+            self._words = None
+            self.keys = array("Q", bytes(16 * buckets))
+            self.data = array("Q", bytes(16 * buckets))
+        else:
+            self._words = memoryview(buffer).cast("Q")
+            self.keys = self._words[:2 * buckets]
+            self.data = self._words[2 * buckets:4 * buckets]
+        self.age = 0
+
+    @classmethod
+    def _buckets(cls, size_mb):
+        buckets = max(1, size_mb * 1024 * 1024 // (2 * cls.ENTRY_BYTES))
+        return 1 << (buckets.bit_length() - 1)
+
+    @classmethod
+    def buffer_size(cls, size_mb):
+        """Return the bytes a buffer for a table of size_mb megabytes must hold."""
+        return 2 * cls.ENTRY_BYTES * cls._buckets(size_mb)
+
+    def clear(self):
+        size = len(self.keys)
+        if self._words is None:
+            self.keys = array("Q", bytes(8 * size))
+            self.data = array("Q", bytes(8 * size))
+        else:
+            self._words[:] = array("Q", bytes(16 * size))
+        self.age = 0
+
+    def close(self):
+        """Release the views of a shared buffer, so its owner can close it."""
+        if self._words is not None:
+            self.keys.release()
+            self.data.release()
+            self._words.release()
+
+    def new_search(self):
+        """Mark existing entries as older than anything stored from now on."""
+        self.age = (self.age + 1) & 63
+
+    def probe(self, key):
+        """Return (move, depth, bound, score) stored for key, or None."""
+        index = (key & self.mask) << 1
+        keys = self.keys
+        data = self.data
+        entry = data[index]
+        if keys[index] ^ entry != key:
+            index += 1
+            entry = data[index]
+            if keys[index] ^ entry != key:
+                return None
+        data = entry
+        if not data:
+            return None
+        return data & 0xFFFF, data >> 16 & 0xFF, data >> 24 & 3, (data >> 32) - 0x80000000
+
+    def store(self, key, move, depth, bound, score):
+        index = (key & self.mask) << 1
+        keys = self.keys
+        data = self.data
+        # Keep the deep entry unless this result is at least as deep or it is stale
+        deep = data[index]
+        if (keys[index] ^ deep != key and deep and deep >> 16 & 0xFF > depth
+                and deep >> 26 & 63 == self.age):
+            index += 1
+        entry = (move | depth << 16 | bound << 24 | self.age << 26
+                 | (score + 0x80000000) << 32)
+        keys[index] = key ^ entry
+        data[index] = entry
+
+
+class MoveOrderer:
+    """Ranks moves so alpha-beta searches the likeliest cutoff first.
+
+    Order: the hash move, captures and promotions by MVV-LVA (most valuable
+    victim, then least valuable attacker), the two killer moves of the ply,
+    the countermove to the opponent's last move, and remaining quiet moves
+    by their history score. All tables are flat arrays allocated once:
+
+    - killers[2 * ply + slot]: quiet moves that caused a cutoff at this ply
+    - history[4096 * color + 64 * from + to]: butterfly table of cutoff credit
+    - countermoves[64 * from + to]: the quiet reply that refuted that move
+
+    Search calls order() before looping over a node's moves and update()
+    when a quiet move fails high; subclass and pass an instance to Search to
+    try a different ordering.
+    """
+
+    HASH_SCORE = 1 << 30
+    CAPTURE_SCORE = 1 << 28
+    KILLER_SCORE = 1 << 26
+    COUNTER_SCORE = 1 << 25
+    HISTORY_MAX = 1 << 24  # history scores stay within +/- this, below the countermove
+
+    def __init__(self):
+        self.killers = array("H", bytes(2 * 2 * (MAX_PLY + 1)))
+        self.history = array("i", bytes(4 * 2 * 4096))
+        self.countermoves = array("H", bytes(2 * 4096))
+
+    def clear(self):
+        for table in (self.killers, self.history, self.countermoves):
+            table[:] = array(table.typecode, bytes(table.itemsize * len(table)))
+
+    def new_search(self):
+        """Forget killers and halve history scores, so the last search only guides the next."""
+        self.killers = array("H", bytes(2 * len(self.killers)))
+        history = self.history
+        for index in range(len(history)):
+            history[index] //= 2
+
+    def order(self, board, moves, hash_move=0, ply=0):
+        """Sort moves in place, best candidates first."""
+        squares = board.squares
+        history = self.history
+        offset = 0 if board.white_to_move else 4096
+        first_killer = self.killers[2 * ply]
+        second_killer = self.killers[2 * ply + 1]
+        played = board._moves
+        counter = self.countermoves[played[-1] & 4095] if played else 0
+
+        def score(move):
+            if move == hash_move:
+                return self.HASH_SCORE
+            flags = move >> 12
+            if flags & (CAPTURE | PROMOTION):
+                victim = squares[move >> 6 & 63]
+                value = 8 * (victim.kind if victim is not None else PAWN) - squares[move & 63].kind
+                if flags & PROMOTION:
+                    value += 8 * (KNIGHT + (flags & 3))
+                return self.CAPTURE_SCORE + value
+            if move == first_killer:
+                return self.KILLER_SCORE + 1
+            if move == second_killer:
+                return self.KILLER_SCORE
+            if move == counter:
+                return self.COUNTER_SCORE
+            return history[offset + (move & 4095)]
+
+        moves.sort(key=score, reverse=True)
+
+    def update(self, board, move, depth, ply, tried=()):
+        """Credit the quiet move that failed high and debit the quiet moves tried before it."""
+        index = 2 * ply
+        killers = self.killers
+        if killers[index] != move:
+            killers[index + 1] = killers[index]
+            killers[index] = move
+        played = board._moves
+        if played:
+            self.countermoves[played[-1] & 4095] = move
+
+        history = self.history
+        offset = 0 if board.white_to_move else 4096
+        bonus = min(depth * depth, 400)
+        limit = self.HISTORY_MAX // 1024
+        # Scores move toward +/- HISTORY_MAX and shrink as they approach it
+        entry = offset + (move & 4095)
+        history[entry] += 1024 * bonus - history[entry] * bonus // limit
+        for other in tried:
+            entry = offset + (other & 4095)
+            history[entry] -= 1024 * bonus + history[entry] * bonus // limit
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class Search:
+    """Iterative deepening alpha-beta (negamax) search.
+
+    search() works on a copy of the board, so it can be stopped at any
+    time without disturbing the caller's position.
+    """
+
+    def __init__(self, hash_mb=16, ordering=None, null_move=True, lmr=True, futility=True,
+                 pvs=True, aspiration=True, tt=None):
+        self.tt = TranspositionTable(hash_mb) if tt is None else tt
+        self.ordering = MoveOrderer() if ordering is None else ordering
+        # Selectivity switches, so each technique can be measured on its own
+        self.null_move = null_move
+        self.lmr = lmr  # late move reductions
+        self.futility = futility  # futility and reverse futility pruning
+        self.pvs = pvs  # principal variation search
+        self.aspiration = aspiration  # aspiration windows around the last iteration's score
+        self.nodes = 0
+        self.depth = 0  # deepest completed iteration
+        self.score = 0
+        self.best_move = None
+        self._deadline = None
+        self._stop = None
+
+    def search(self, board, depth=None, movetime=None, stop=None, info=None, first_depth=1):
+        """Search for up to depth plies and/or movetime seconds and return the best move.
+
+        stop is an optional threading.Event that ends the search early, and
+        info an optional callable passed this Search after every completed
+        iteration. Iterative deepening starts at first_depth, and that first
+        iteration always completes, so the returned move has been searched
+        even under a short movetime. Returns None if the side to move has no
+        legal moves.
+        """
+        board = board.copy()
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self._deadline = None if movetime is None else time.perf_counter() + movetime
+        self._stop = stop
+        self.tt.new_search()
+        self.ordering.new_search()
+
+        root_moves = list(board.legal_moves())
+        self.best_move = root_moves[0] if len(root_moves) == 1 else None
+        if len(root_moves) < 2:
+            return self.best_move
+        entry = self.tt.probe(board.hash)
+        self.ordering.order(board, root_moves, entry[0] if entry is not None else 0)
+
+        max_depth = MAX_PLY if depth is None else depth
+        for iteration in range(min(first_depth, max_depth), max_depth + 1):
+            try:
+                score, move = self._search_iteration(board, root_moves, iteration)
+            except SearchAborted:
+                break
+            self.depth = iteration
+            self.score = score
+            self.best_move = move
+            if info is not None:
+                info(self)
+            if abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+            # Search the best move first on the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+        return self.best_move
+
+    def score_moves(self, board, moves, depth):
+        """Return the exact score of each move after a depth-ply search, for a multi-PV list.
+
+        Scores are from the side to move's point of view. Every move gets a
+        full window, so unlike search() no move is cut off by a better one.
+        """
+        board = board.copy()
+        self.nodes = 0
+        self._deadline = None
+        self._stop = None
+        self.tt.new_search()
+        self.ordering.new_search()
+        scores = [0] * len(moves)
+        for iteration in range(1, depth + 1):
+            for index, move in enumerate(moves):
+                board.make_move(move)
+                scores[index] = -self._negamax(board, iteration - 1, -INFINITY, INFINITY, 1)
+                board.unmake_move()
+        return scores
+
+    def principal_variation(self, board, limit=MAX_PLY):
+        """Return the best move and the line the transposition table expects to follow it."""
+        if self.best_move is None:
+            return []
+        board = board.copy()
+        line = [self.best_move]
+        board.make_move(self.best_move)
+        seen = {board.hash}
+        while len(line) < limit:
+            entry = self.tt.probe(board.hash)
+            if entry is None or entry[2] != EXACT or entry[0] not in board.legal_moves():
+                break
+            line.append(entry[0])
+            board.make_move(entry[0])
+            if board.hash in seen:
+                break
+            seen.add(board.hash)
+        return line
+
+    def _search_iteration(self, board, moves, depth):
+        """Search the root to depth, in a narrow window around the last score if enabled.
+
+        A result outside the window is only a bound, so the window is widened
+        on the failing side and the root searched again.
+        """
+        if not self.aspiration or depth < 4 or abs(self.score) >= MATE_SCORE - MAX_PLY:
+            return self._search_root(board, moves, depth, -INFINITY, INFINITY)
+        delta = ASPIRATION_WINDOW
+        alpha = self.score - delta
+        beta = self.score + delta
+        while True:
+            score, move = self._search_root(board, moves, depth, alpha, beta)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITY)
+            elif score >= beta:
+                beta = min(score + delta, INFINITY)
+            else:
+                return score, move
+            delta *= 2
+            if delta > 4 * PIECE_VALUES[QUEEN]:
+                alpha, beta = -INFINITY, INFINITY
+
+    def _search_root(self, board, moves, depth, alpha, beta):
+        best = -INFINITY
+        best_move = moves[0]
+        for index, move in enumerate(moves):
+            board.make_move(move)
+            if index == 0 or not self.pvs:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self._negamax(board, depth - 1, -alpha - 1, -alpha, 1)
+                if alpha < score < beta:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+            board.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    # Beats the window, so search() returns it if the rest of the iteration is cut off
+                    self.best_move = move
+                    if alpha >= beta:
+                        break
+        return best, best_move
+
+    def _negamax(self, board, depth, alpha, beta, ply, null_allowed=True):
+        if depth <= 0:
+            return self._quiescence(board, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & 255:
+            self._check_limits()
+
+        hash_move = 0
+        entry = self.tt.probe(board.hash)
+        if entry is not None:
+            hash_move, entry_depth, bound, score = entry
+            if entry_depth >= depth:
+                score = _score_from_tt(score, ply)
+                if (bound == EXACT or (bound == LOWER_BOUND and score >= beta)
+                        or (bound == UPPER_BOUND and score <= alpha)):
+                    return score
+
+        in_check = board.is_check()
+        # With PVS, only null-window nodes are pruned so the principal variation is exact;
+        # plain alpha-beta has no such distinction and prunes everywhere
+        pv_node = self.pvs and beta - alpha > 1
+        futile = False
+        if not in_check and not pv_node and abs(beta) < MATE_SCORE - MAX_PLY:
+            static_eval = self.evaluate(board)
+            if self.futility:
+                if depth <= 3 and static_eval - REVERSE_FUTILITY_MARGIN * depth >= beta:
+                    return static_eval
+                futile = depth < len(FUTILITY_MARGINS) and static_eval + FUTILITY_MARGINS[depth] <= alpha
+            # Passing is only a safe lower bound when the side has pieces to move,
+            # since pawn endings are where zugzwang is common
+            if (self.null_move and null_allowed and depth >= NULL_MOVE_MIN_DEPTH
+                    and static_eval >= beta and self._has_pieces(board)):
+                reduction = 3 if depth > 6 else 2
+                board.make_null_move()
+                score = -self._negamax(board, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+                board.unmake_null_move()
+                if score >= beta:
+                    # A mate found after passing is not proven, so do not report it
+                    return beta if score >= MATE_SCORE - MAX_PLY else score
+
+        moves = list(board.legal_moves())
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        self.ordering.order(board, moves, hash_move, ply)
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = 0
+        quiets = []  # quiet moves searched so far, debited when a later one fails high
+        for index, move in enumerate(moves):
+            quiet = not move >> 12 & (CAPTURE | PROMOTION)
+            board.make_move(move)
+            gives_check = board.last_move_checks()
+            if futile and quiet and not gives_check and best > -MATE_SCORE + MAX_PLY:
+                board.unmake_move()
+                continue
+            if index == 0:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                reduction = 0
+                if (self.lmr and quiet and depth >= LMR_MIN_DEPTH and index >= LMR_MIN_MOVES
+                        and not in_check and not gives_check):
+                    reduction = LMR_REDUCTIONS[depth][min(index, 63)] - pv_node
+                    reduction = max(0, min(reduction, depth - 2))
+                window = -alpha - 1 if self.pvs else -beta
+                score = -self._negamax(board, depth - 1 - reduction, window, -alpha, ply + 1)
+                if reduction and score > alpha:
+                    score = -self._negamax(board, depth - 1, window, -alpha, ply + 1)
+                if self.pvs and alpha < score < beta:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not move >> 12 & (CAPTURE | PROMOTION):
+                            self.ordering.update(board, move, depth, ply, quiets)
+                        break
+            if not move >> 12 & (CAPTURE | PROMOTION):
+                quiets.append(move)
+
+        if best >= beta:
+            bound = LOWER_BOUND
+        elif best > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        self.tt.store(board.hash, best_move, depth, bound, _score_to_tt(best, ply))
+        return best
+
+    def _quiescence(self, board, alpha, beta, ply):
+        """Search captures until the position is quiet, so the horizon does not hide a recapture.
+
+        The side to move may stand pat on the static evaluation instead of
+        capturing. Captures that could not raise the score to alpha even
+        with DELTA_MARGIN to spare, or that lose material by static exchange,
+        are skipped. In check every evasion is searched.
+        """
+        self.nodes += 1
+        if not self.nodes & 255:
+            self._check_limits()
+        if ply >= MAX_PLY:
+            return self.evaluate(board)
+        in_check = board.is_check()
+        if in_check:
+            moves = list(board.legal_moves())
+            if not moves:
+                return -MATE_SCORE + ply
+            best = -INFINITY
+        else:
+            best = self.evaluate(board)
+            if best >= beta:
+                return best
+            if best > alpha:
+                alpha = best
+            moves = list(board.legal_moves(captures=True))
+
+        self.ordering.order(board, moves, 0, ply)
+        squares = board.squares
+        for move in moves:
+            if not in_check:
+                flags = move >> 12
+                victim = squares[move >> 6 & 63]
+                gain = PIECE_VALUES[victim.kind] if victim is not None else PIECE_VALUES[PAWN]
+                if not flags & PROMOTION:
+                    if best + gain + DELTA_MARGIN <= alpha:
+                        continue
+                    # A capture of a piece worth at least the capturer cannot lose material
+                    if gain < PIECE_VALUES[squares[move & 63].kind] and board.see(move) < 0:
+                        continue
+            board.make_move(move)
+            score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    @staticmethod
+    def _has_pieces(board) -> bool:
+        """Return True if the side to move has a knight, bishop, rook or queen."""
+        bitboards = board.bitboards
+        offset = 0 if board.white_to_move else 6
+        return bool(bitboards[KNIGHT + offset] | bitboards[BISHOP + offset]
+                    | bitboards[ROOK + offset] | bitboards[QUEEN + offset])
+
+    def _check_limits(self):
+        if not self.depth:
+            return  # the first iteration always completes, so the best move has been searched
+        if self._stop is not None and self._stop.is_set():
+            raise SearchAborted()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchAborted()
+
+    @staticmethod
+    def evaluate(board) -> int:
+        """Static evaluation from the side to move's point of view."""
+        return board.psq_score if board.white_to_move else -board.psq_score
+
+
+class LazySmpSearch(Search):
+    """Search that shares its transposition table with helper processes (Lazy SMP).
+
+    The table lives in multiprocessing.shared_memory. On every search the
+    helpers search the same position while this process does, the odd ones
+    starting one ply deeper, and each benefits from the entries the others
+    store. When this process finishes, the helpers are stopped and the result
+    of the deepest completed iteration among all of them is returned.
+
+    Helper processes keep running between searches; call close() when done.
+    """
+
+    def __init__(self, hash_mb=16, workers=None, **options):
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 1) - 1)
+        memory = shared_memory.SharedMemory(create=True, size=TranspositionTable.buffer_size(hash_mb))
+        super().__init__(hash_mb, tt=TranspositionTable(hash_mb, memory.buf), **options)
+        context = multiprocessing.get_context()
+        self._memory = memory
+        self._halt = context.Event()  # stops the helpers' current search
+        # (process, connection) per live helper; a helper that dies is dropped
+        self._helpers = []
+        for index in range(1, workers + 1):
+            connection, helper_connection = context.Pipe()
+            worker = context.Process(target=_lazy_smp_helper, daemon=True,
+                                     args=(memory, hash_mb, index, helper_connection, self._halt, options))
+            worker.start()
+            # Only the helper holds its end now, so its exit shows up here as end of file
+            helper_connection.close()
+            self._helpers.append((worker, connection))
+        self._finalizer = weakref.finalize(self, _close_lazy_smp, self.tt, memory, self._helpers)
+
+    def search(self, board, depth=None, movetime=None, stop=None, info=None, first_depth=1):
+        fen = board.to_fen()
+        self._halt.clear()
+        pending = {}
+        for helper in self._helpers[:]:
+            try:
+                helper[1].send((fen, depth, movetime))
+            except OSError:
+                self._drop_helper(helper)
+            else:
+                pending[helper[1]] = helper
+        try:
+            best = super().search(board, depth, movetime, stop, info, first_depth)
+        finally:
+            self._halt.set()
+            results = []
+            while pending:
+                for ready in multiprocessing.connection.wait(list(pending)):
+                    helper = pending.pop(ready)
+                    try:
+                        results.append(ready.recv())
+                    except (EOFError, OSError):
+                        self._drop_helper(helper)
+
+        for helper_depth, score, move, nodes in results:
+            self.nodes += nodes
+            if move is not None and helper_depth > self.depth:
+                self.depth = helper_depth
+                self.score = score
+                self.best_move = best = move
+        return best
+
+    def _drop_helper(self, helper):
+        worker, connection = helper
+        self._helpers.remove(helper)
+        connection.close()
+        worker.join(1)
+
+    def close(self):
+        """Stop the helper processes and free the shared table."""
+        self._finalizer()
+
+
+def _lazy_smp_helper(memory, hash_mb, index, connection, halt, options):
+    search = Search(tt=TranspositionTable(hash_mb, memory.buf), **options)
+    try:
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+            fen, depth, movetime = task
+            result = (0, 0, None, 0)
+            try:
+                move = search.search(Board.from_fen(fen), depth, movetime, halt, first_depth=1 + index % 2)
+                result = (search.depth, search.score, move, search.nodes)
+            finally:
+                # The main process waits for one result per task, even from a failed search
+                connection.send(result)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        search.tt.close()
+
+
+def _close_lazy_smp(tt, memory, helpers):
+    for worker, connection in helpers:
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+    for worker, connection in helpers:
+        worker.join(1)
+        if worker.is_alive():
+            worker.terminate()
+        connection.close()
+    tt.close()
+    memory.close()
+    memory.unlink()
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node rather than the root
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
 class Player(ABC):
     def __init__(self, white_side: bool, human_player: bool):
         self.white_side = white_side
@@ -269,25 +2099,99 @@ class HumanPlayer(Player):
 
 
 class ComputerPlayer(Player):
-    def __init__(self, white_side: bool):
+    def __init__(self, white_side: bool, depth=None, movetime=0.1, hash_mb=16, workers=1):
         super().__init__(white_side, False)
+        self.depth = depth  # maximum search depth in plies, None for no limit
+        self.movetime = movetime  # seconds per move, None for no limit
+        # More than one worker searches with Lazy SMP helper processes
+        self.search = Search(hash_mb) if workers <= 1 else LazySmpSearch(hash_mb, workers - 1)
+
+    def choose_move(self, game):
+        """Search the game's position and return the Move to play, or None if there is none."""
+        board = game.board
+        code = self.search.search(board, self.depth, self.movetime)
+        if code is None:
+            return None
+        return Move.from_code(self, board, code)
 
 
 class Move:
-    def __init__(self, player, start, end):
+    def __init__(self, player, start, end, promotion=None):
         self.player = player
         self.start = start
         self.end = end
         self.piece_moved = start.piece
         self.piece_killed = end.piece if end.piece else None
+        self.promotion = promotion  # piece kind a pawn promotes to, queen by default
         self.castling_move = False
 
+    @classmethod
+    def from_code(cls, player, board, code):
+        """Build the Move for an encoded move on board.
+
+        Its Spots are detached copies of the start and end squares, so the
+        board never has to build its grid of BoardSpot views for it.
+        """
+        start = code & 63
+        end = code >> 6 & 63
+        promotion = (code >> 12 & 3) + KNIGHT if code >> 12 & PROMOTION else None
+        squares = board.squares
+        return cls(player, Spot(start >> 3, start & 7, squares[start]),
+                   Spot(end >> 3, end & 7, squares[end]), promotion)
+
     def is_castling_move(self):
         return self.castling_move
 
     def set_castling_move(self, castling_move: bool):
         self.castling_move = castling_move
 
+class MoveHistory:
+    """Move list that stores each ply as a 16-bit move code in an array('H').
+
+    It stands in for the list of Move objects in Game.moves_played. Indexing
+    decodes a Move view on demand; its Spots are detached copies holding the
+    moved and captured pieces, so the history never aliases live squares.
+    """
+
+    def __init__(self, game):
+        self._game = game
+        self.codes = array("H")
+
+    def append_code(self, code):
+        self.codes.append(code)
+
+    def pop(self):
+        move = self[-1]
+        self.codes.pop()
+        return move
+
+    def clear(self):
+        del self.codes[:]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.codes)
+        code = self.codes[index]
+        game = self._game
+        _, piece, captured = game.board.played_move(index - len(self.codes))
+        white = (index % 2 == 0) == (game.start_fen.split()[1] != "b")
+        player = next((player for player in game.players
+                       if player is not None and player.is_white_side() == white), None)
+        start = code & 63
+        end = code >> 6 & 63
+        promotion = (code >> 12 & 3) + KNIGHT if code >> 12 & PROMOTION else None
+        move = Move(player, Spot(start >> 3, start & 7, piece), Spot(end >> 3, end & 7, captured), promotion)
+        move.castling_move = code >> 12 in (KING_CASTLE, QUEEN_CASTLE)
+        return move
+
+    def __iter__(self):
+        for index in range(len(self.codes)):
+            yield self[index]
+
+
 class GameStatus(Enum):
     ACTIVE = 1
     BLACK_WIN = 2
@@ -295,24 +2199,135 @@ class GameStatus(Enum):
     FORFEIT = 4
     STALEMATE = 5
     RESIGNATION = 6
+    DRAW = 7  # threefold repetition or fifty-move rule
+
+
+class EventType(Enum):
+    MOVE = 1
+    CAPTURE = 2
+    CASTLING = 3
+    PROMOTION = 4
+    GAME_OVER = 5
+    INVALID_PLAYER = 6
+    INVALID_PIECE = 7
+    INVALID_MOVE = 8
+    CHECK = 9
+    UNDO = 10
+
+
+class GameEvent:
+    def __init__(self, type, move=None, piece=None, status=None):
+        self.type = type
+        self.move = move
+        self.piece = piece  # piece captured, or piece a pawn promoted to
+        self.status = status
+
+
+def print_event(game, event):
+    """Console renderer for game events, the output Game produced before events existed."""
+    if event.type == EventType.MOVE or event.type == EventType.UNDO:
+        game.board.print_board()
+    elif event.type == EventType.CAPTURE:
+        print("Killed")
+    elif event.type == EventType.CASTLING:
+        print("Castling")
+    elif event.type == EventType.CHECK:
+        print("Check")
+    elif event.type == EventType.GAME_OVER:
+        print("Game over")
+        print(event.status)
+    elif event.type == EventType.INVALID_PLAYER:
+        print("Invalid player")
+    elif event.type == EventType.INVALID_PIECE:
+        print("Invalid piece")
+    elif event.type == EventType.INVALID_MOVE:
+        print("Invalid move")
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, compact_history=False, compact_board=False):
         self.players = [None, None]  # type: List[Optional[Player]]
-        self.board = Board()
+        # A compact board shares piece objects between games (see Board.new_piece)
+        self.board = Board(compact=compact_board)
         self.current_turn = None  # type: Optional[Player]
         self.status = GameStatus.ACTIVE
-        self.moves_played = []
-
-    def initialize(self, p1, p2):
+        # A compact history keeps 2 bytes per ply instead of a Move object
+        self.compact_history = compact_history
+        self.moves_played = MoveHistory(self) if compact_history else []
+        self.halfmove_clock = 0  # plies since the last capture or pawn move
+        self.fullmove_number = 1
+        self.start_fen = START_FEN
+        self.in_check = False  # whether the side to move is in check
+        # Zobrist key of every position so far; repetition checks only scan the last
+        # halfmove_clock entries, since a capture or pawn move makes earlier ones unreachable
+        self.position_hashes = array("Q", [self.board.hash])
+        # Halfmove clock before each move, and the codes of moves taken back for redo()
+        self._clock_history = array("I")
+        self._redo_codes = array("H")
+        # Callables taking (game, event); a headless game starts with none and prints nothing
+        self.listeners = []
+        if not headless:
+            self.subscribe(print_event)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def publish(self, type, move=None, piece=None):
+        event = GameEvent(type, move, piece, self.status)
+        for listener in self.listeners:
+            listener(self, event)
+
+    def initialize(self, p1, p2, fen=None):
         self.players[0] = p1
         self.players[1] = p2
 
-        self.board.reset_board()
-
-        self.current_turn = p1 if p1.is_white_side() else p2
+        if fen is None:
+            self.board.reset_board()
+            self.start_fen = START_FEN
+            self.halfmove_clock = 0
+            self.fullmove_number = 1
+            self.current_turn = p1 if p1.is_white_side() else p2
+            self.status = GameStatus.ACTIVE
+            self.in_check = False
+            self.moves_played.clear()
+            self._reset_position_hashes()
+        else:
+            self.load_fen(fen)
+
+    def _reset_position_hashes(self):
+        del self.position_hashes[:]
+        self.position_hashes.append(self.board.hash)
+        del self._clock_history[:]
+        del self._redo_codes[:]
+
+    def load_fen(self, fen):
+        """Continue the game from a FEN position, keeping the current players.
+
+        An invalid FEN raises ValueError and leaves the game as it was.
+        """
+        fields = fen.split()
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Invalid FEN move counters: %r" % fen)
+        self.board.set_fen(fen)
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        white = self.board.white_to_move
+        self.current_turn = next((player for player in self.players
+                                  if player is not None and player.is_white_side() == white), None)
+        self.start_fen = fen
+        self.status = GameStatus.ACTIVE
+        self.in_check = self.board.is_check()
         self.moves_played.clear()
+        self._reset_position_hashes()
+
+    def to_fen(self) -> str:
+        return self.board.to_fen(self.halfmove_clock, self.fullmove_number)
 
     def is_end(self):
         return self.status != GameStatus.ACTIVE
@@ -323,14 +2338,40 @@ class Game:
     def set_status(self, status):
         self.status = status
 
-    def player_move(self, player, start_x, start_y, end_x, end_y):
+    def is_threefold_repetition(self) -> bool:
+        hashes = self.position_hashes
+        current = hashes[-1]
+        oldest = max(len(hashes) - 1 - self.halfmove_clock, 0)
+        count = 1
+        # Only positions with the same side to move can match: every other entry
+        for index in range(len(hashes) - 3, oldest - 1, -2):
+            if hashes[index] == current:
+                count += 1
+                if count == 3:
+                    return True
+        return False
+
+    def is_fifty_move_draw(self) -> bool:
+        return self.halfmove_clock >= 100
+
+    def computer_move(self):
+        """Let the computer player whose turn it is choose and play a move."""
+        player = self.current_turn
+        if self.is_end() or player is None or player.is_human_player():
+            return False
+        move = player.choose_move(self)
+        if move is None:
+            return False
+        return self.make_move(move, player)
+
+    def player_move(self, player, start_x, start_y, end_x, end_y, promotion=None):
         try:
             start_box = self.board.get_box(start_x, start_y)
             end_box = self.board.get_box(end_x, end_y)
         except Exception as e:
             return False
 
-        move = Move(player, start_box, end_box)
+        move = Move(player, start_box, end_box, promotion)
         return self.make_move(move, player)
 
     def make_move(self, move, player):
@@ -338,54 +2379,168 @@ class Game:
         if source_piece is None:
             return False
 
+        # Events are only built when someone is listening, so headless games pay nothing
+        listeners = self.listeners
+
         # valid player
         if player != self.current_turn:
-            print("Invalid player")
+            if listeners:
+                self.publish(EventType.INVALID_PLAYER, move)
             return False
 
         if source_piece.white != player.is_white_side():
-            print("Invalid piece")
+            if listeners:
+                self.publish(EventType.INVALID_PIECE, move)
             return False
 
-        # valid move?
-        if not source_piece.can_move(self.board, move.start, move.end):
-            print("Invalid move")
+        # valid move? The board also rejects moves that leave the king in check
+        code = self.board.find_move(move.start.x * 8 + move.start.y,
+                                    move.end.x * 8 + move.end.y, move.promotion)
+        if code is None:
+            if listeners:
+                self.publish(EventType.INVALID_MOVE, move)
+            return False
+
+        del self._redo_codes[:]
+        return self._play(code, move, player)
+
+    def play(self, code):
+        """Play an encoded legal move, e.g. one from Board.legal_moves, for the side to move."""
+        player = self.current_turn
+        del self._redo_codes[:]
+        return self._play(code, Move.from_code(player, self.board, code), player)
+
+    def undo(self):
+        """Take back the last move in constant time and return it, or None if there is none.
+
+        The board restores itself from its undo record; the game restores the
+        clocks, turn and status it saved for the move. redo() replays it.
+        """
+        if not self.moves_played:
+            return None
+        move = self.moves_played.pop()
+        code, piece, captured = self.board.played_move(-1)
+        self.board.unmake_move()
+        if not self.board.compact:
+            if captured is not None:
+                captured.killed = False
+            if code >> 12 in (KING_CASTLE, QUEEN_CASTLE):
+                piece.castling_done = False
+
+        self.position_hashes.pop()
+        self.halfmove_clock = self._clock_history.pop()
+        if not piece.white:
+            self.fullmove_number -= 1
+        self.current_turn = self.players[1] if self.current_turn == self.players[0] else self.players[0]
+        self.status = GameStatus.ACTIVE
+        self.in_check = self.board.is_check()
+        self._redo_codes.append(code)
+
+        if self.listeners:
+            self.publish(EventType.UNDO, move)
+        return move
+
+    def redo(self) -> bool:
+        """Replay the last move taken back with undo()."""
+        if not self._redo_codes:
             return False
+        code = self._redo_codes.pop()
+        player = self.current_turn
+        return self._play(code, Move.from_code(player, self.board, code), player)
+
+    def _play(self, code, move, player):
+        source_piece = move.piece_moved
+        listeners = self.listeners
+
+        # move piece from start to end box
+        self._clock_history.append(self.halfmove_clock)
+        dest_piece = self.board.make_move(code)
+        if dest_piece is not None or isinstance(source_piece, Pawn):
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not source_piece.white:
+            self.fullmove_number += 1
+
+        # Shared pieces on a compact board carry no per-game state
+        compact_board = self.board.compact
 
         # kill?
-        dest_piece = move.end.piece
         if dest_piece is not None:
-            print("Killed")
-            dest_piece.set_killed(True)
-            move.set_piece_killed(dest_piece)
+            if not compact_board:
+                dest_piece.killed = True
+            move.piece_killed = dest_piece
+            if listeners:
+                self.publish(EventType.CAPTURE, move, dest_piece)
 
         # castling?
-        if isinstance(source_piece, King) and source_piece.is_castling_move(move.start, move.end):
-            print("Castling")
+        if code >> 12 in (KING_CASTLE, QUEEN_CASTLE):
             move.set_castling_move(True)
+            if not compact_board:
+                source_piece.castling_done = True
+            if listeners:
+                self.publish(EventType.CASTLING, move)
 
-        # store the move
-        self.moves_played.append(move)
-
-        # move piece from start to end box
-        move.end.piece = move.start.piece
-        move.start.piece = None
+        if code >> 12 & PROMOTION and listeners:
+            self.publish(EventType.PROMOTION, move, self.board.squares[code >> 6 & 63])
 
-        if isinstance(dest_piece, King):
-            print("Game over")
-            self.set_status(GameStatus.WHITE_WIN if player.is_white_side() else GameStatus.BLACK_WIN)
-            print(self.get_status())
+        # store the move
+        if self.compact_history:
+            self.moves_played.append_code(code)
+        else:
+            self.moves_played.append(move)
 
         # switch turns
         self.current_turn = self.players[1] if self.current_turn == self.players[0] else self.players[0]
 
-        self.board.print_board()
+        self.position_hashes.append(self.board.hash)
+
+        # check, checkmate or stalemate? Only the move just played can have changed that
+        self.in_check = self.board.last_move_checks()
+        if not self.board.has_legal_move():
+            if self.in_check:
+                self.set_status(GameStatus.WHITE_WIN if source_piece.white else GameStatus.BLACK_WIN)
+            else:
+                self.set_status(GameStatus.STALEMATE)
+            if listeners:
+                self.publish(EventType.GAME_OVER, move)
+        elif self.is_threefold_repetition() or self.is_fifty_move_draw():
+            self.set_status(GameStatus.DRAW)
+            if listeners:
+                self.publish(EventType.GAME_OVER, move)
+        elif self.in_check and listeners:
+            self.publish(EventType.CHECK, move)
+
+        if listeners:
+            self.publish(EventType.MOVE, move)
 
         return True
 
 
 
-if __name__ == "__main__":
+def run_perft_suite(depth):
+    """Run perft on the standard positions, print node counts and speed, return the failures."""
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in PERFT_POSITIONS:
+        board = Board.from_fen(fen)
+        position_depth = min(depth, len(expected))
+        started = time.perf_counter()
+        nodes = board.perft(position_depth)
+        elapsed = time.perf_counter() - started
+        ok = nodes == expected[position_depth - 1]
+        failures += not ok
+        total_nodes += nodes
+        total_time += elapsed
+        print("%-10s depth %d  %10d nodes  %8.2fs  %9.0f nps  %s" % (
+            name, position_depth, nodes, elapsed, nodes / elapsed,
+            "ok" if ok else "FAIL (expected %d)" % expected[position_depth - 1]))
+    print("total %d nodes in %.2fs, %.0f nps" % (total_nodes, total_time, total_nodes / total_time))
+    return failures
+
+
+def demo():
     game = Game()
     p1 = HumanPlayer(True)
     p2 = HumanPlayer(False)
@@ -411,10 +2566,39 @@ if __name__ == "__main__":
     game.player_move(p2, 7, 1, 5, 2)  # Black knight b8 to c6
 
     print("\nWhite player moves:")
-    game.player_move(p1, 0, 3, 4, 7)  # White queen d1 to h5
+    game.player_move(p1, 2, 5, 4, 4)  # White knight f3 takes e5
 
     print("\nBlack player moves:")
-    game.player_move(p2, 6, 6, 5, 6)  # Black pawn g7 to g6
+    game.player_move(p2, 5, 2, 4, 4)  # Black knight c6 takes e5
 
     print("\nWhite player moves:")
-    game.player_move(p1, 4, 7, 5, 6)  # Queen h5 takes g6
+    game.player_move(p1, 1, 3, 3, 3)  # White pawn d2 to d4
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Console chess game")
+    commands = parser.add_subparsers(dest="command")
+    perft_parser = commands.add_parser("perft", help="count move generation nodes and speed")
+    perft_parser.add_argument("depth", type=int, nargs="?", default=3)
+    perft_parser.add_argument("--fen", help="position to search instead of the standard suite")
+    perft_parser.add_argument("--divide", action="store_true",
+                              help="print the node count below each root move")
+    args = parser.parse_args()
+
+    if args.command == "perft":
+        if args.fen is None:
+            sys.exit(1 if run_perft_suite(args.depth) else 0)
+        board = Board.from_fen(args.fen)
+        started = time.perf_counter()
+        if args.divide:
+            counts = board.divide(args.depth)
+            for move in sorted(counts):
+                print("%s: %d" % (move, counts[move]))
+            nodes = sum(counts.values())
+        else:
+            nodes = board.perft(args.depth)
+        elapsed = time.perf_counter() - started
+        print("%d nodes in %.2fs, %.0f nps" % (nodes, elapsed, nodes / elapsed))
+    else:
+        demo()
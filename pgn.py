@@ -0,0 +1,241 @@
+"""Streaming PGN reader and writer for chess.Game.
+
+read_games() reads one line at a time and yields games as it finishes them,
+so arbitrarily large archives are processed in constant memory:
+
+    with open("archive.pgn") as stream:
+        for pgn_game in read_games(stream):
+            game = replay(pgn_game)
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from chess import (
+    CAPTURE, KING_CASTLE, KNIGHT, PAWN, PIECE_SYMBOLS, PROMOTION, QUEEN_CASTLE,
+    SQUARE_INDEX, SQUARE_NAMES, START_FEN, Board, Game, GameStatus, HumanPlayer,
+)
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+STATUS_RESULTS = {
+    GameStatus.WHITE_WIN: "1-0",
+    GameStatus.BLACK_WIN: "0-1",
+    GameStatus.STALEMATE: "1/2-1/2",
+    GameStatus.DRAW: "1/2-1/2",
+}
+
+_TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN_RE = re.compile(r"[{}();]|[^\s{}();]+")
+_MOVE_NUMBER_RE = re.compile(r"^\d+\.+")
+_SAN_RE = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+_PIECE_LETTERS = {letter: kind for kind, letter in enumerate("PNBRQK")}
+
+
+class PgnGame:
+    def __init__(self, headers, moves, result="*"):
+        self.headers = headers  # tag pairs in file order
+        self.moves = moves  # SAN strings, annotations removed
+        self.result = result
+
+
+def read_games(stream):
+    """Yield a PgnGame for each game in a text stream, reading it line by line.
+
+    Comments, variations and numeric annotation glyphs are skipped.
+    """
+    headers = {}
+    moves = []
+    comment = False  # inside a {...} comment, which may span lines
+    variation_depth = 0
+    for line in stream:
+        if not comment and line.startswith("%"):
+            continue
+        if not comment and not variation_depth and line.lstrip().startswith("["):
+            if moves:
+                # Movetext without a result token: the next game's tags end it
+                yield PgnGame(headers, moves)
+                headers, moves = {}, []
+            for key, value in _TAG_RE.findall(line):
+                headers[key] = value.replace('\\"', '"').replace("\\\\", "\\")
+            continue
+
+        for token in _TOKEN_RE.findall(line):
+            if comment:
+                if token == "}":
+                    comment = False
+                continue
+            if token == "{":
+                comment = True
+            elif token == ";":
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth:
+                continue
+            elif token in RESULTS:
+                yield PgnGame(headers, moves, token)
+                headers, moves = {}, []
+            elif token[0] != "$":
+                san = _MOVE_NUMBER_RE.sub("", token)
+                if san:
+                    moves.append(san)
+
+    if headers or moves:
+        yield PgnGame(headers, moves, headers.get("Result", "*"))
+
+
+def parse_san(board, san):
+    """Return the encoded legal move for a SAN string such as 'Nbd7', 'exd5' or 'e8=Q+'."""
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        flags = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        for move in board.legal_moves():
+            if move >> 12 == flags:
+                return move
+        raise ValueError("Illegal move %r" % san)
+
+    match = _SAN_RE.match(text)
+    if match is None:
+        raise ValueError("Invalid SAN move %r" % san)
+    letter, from_file, from_rank, target, promotion = match.groups()
+    kind = _PIECE_LETTERS[letter] if letter else PAWN
+    end = SQUARE_INDEX[target]
+    promotion_flags = _PIECE_LETTERS[promotion] - KNIGHT if promotion else None
+
+    found = None
+    squares = board.squares
+    for move in board.legal_moves():
+        start = move & 63
+        if move >> 6 & 63 != end or squares[start].kind != kind:
+            continue
+        if from_file and SQUARE_NAMES[start][0] != from_file:
+            continue
+        if from_rank and SQUARE_NAMES[start][1] != from_rank:
+            continue
+        flags = move >> 12
+        if flags & PROMOTION and (flags & 3) != promotion_flags:
+            continue
+        if found is not None:
+            raise ValueError("Ambiguous move %r" % san)
+        found = move
+    if found is None:
+        raise ValueError("Illegal move %r" % san)
+    return found
+
+
+def move_to_san(board, move):
+    """Return the SAN string for an encoded legal move on board."""
+    start = move & 63
+    end = move >> 6 & 63
+    flags = move >> 12
+    if flags == KING_CASTLE:
+        san = "O-O"
+    elif flags == QUEEN_CASTLE:
+        san = "O-O-O"
+    else:
+        kind = board.squares[start].kind
+        if kind == PAWN:
+            san = SQUARE_NAMES[start][0] if flags & CAPTURE else ""
+        else:
+            san = PIECE_SYMBOLS[kind]
+            rivals = [other & 63 for other in board.legal_moves()
+                      if other >> 6 & 63 == end and other & 63 != start
+                      and board.squares[other & 63].kind == kind]
+            if rivals:
+                name = SQUARE_NAMES[start]
+                if all(SQUARE_NAMES[rival][0] != name[0] for rival in rivals):
+                    san += name[0]
+                elif all(SQUARE_NAMES[rival][1] != name[1] for rival in rivals):
+                    san += name[1]
+                else:
+                    san += name
+        if flags & CAPTURE:
+            san += "x"
+        san += SQUARE_NAMES[end]
+        if flags & PROMOTION:
+            san += "=" + "NBRQ"[flags & 3]
+
+    board.make_move(move)
+    if board.is_check():
+        san += "+" if any(True for _ in board.legal_moves()) else "#"
+    board.unmake_move()
+    return san
+
+
+def replay(pgn_game, headless=True):
+    """Play a PgnGame into a new Game between two human players.
+
+    Raises ValueError at the first move that is not legal in the position.
+    """
+    game = Game(headless=headless)
+    game.initialize(HumanPlayer(True), HumanPlayer(False), pgn_game.headers.get("FEN"))
+    for san in pgn_game.moves:
+        game.play(parse_san(game.board, san))
+    return game
+
+
+def write_game(game, stream, headers=None):
+    """Write game.moves_played to a text stream as one PGN game."""
+    result = STATUS_RESULTS.get(game.get_status(), "*")
+    tags = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?",
+            "White": "?", "Black": "?", "Result": result}
+    if game.start_fen != START_FEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = game.start_fen
+    if headers:
+        tags.update(headers)
+    for key, value in tags.items():
+        stream.write('[%s "%s"]\n' % (key, value.replace("\\", "\\\\").replace('"', '\\"')))
+    stream.write("\n")
+
+    board = Board.from_fen(game.start_fen)
+    fields = game.start_fen.split()
+    number = int(fields[5]) if len(fields) > 5 else 1
+    tokens = []
+    for move in game.moves_played:
+        code = board.find_move(move.start.x * 8 + move.start.y, move.end.x * 8 + move.end.y,
+                               move.promotion)
+        if board.white_to_move:
+            tokens.append("%d." % number)
+        elif not tokens:
+            tokens.append("%d..." % number)
+        tokens.append(move_to_san(board, code))
+        if not board.white_to_move:
+            number += 1
+        board.make_move(code)
+    tokens.append(tags["Result"])
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            stream.write(line + "\n")
+            line = token
+        else:
+            line = line + " " + token if line else token
+    stream.write(line + "\n\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the games in a PGN file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    games = plies = errors = 0
+    started = time.perf_counter()
+    with open(args.path, encoding="utf-8", errors="replace") as pgn_file:
+        for pgn_game in read_games(pgn_file):
+            games += 1
+            try:
+                plies += len(replay(pgn_game).moves_played)
+            except ValueError as error:
+                errors += 1
+                print("game %d: %s" % (games, error), file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print("%d games, %d plies, %d errors in %.2fs" % (games, plies, errors, elapsed))
+    sys.exit(1 if errors else 0)
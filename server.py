@@ -0,0 +1,214 @@
+"""Asyncio server hosting many concurrent chess games over a line-based TCP protocol.
+
+Every connection is a coroutine on one event loop, so thousands of games share a
+single thread. Each command is one line and gets one reply line:
+
+    NEW [white|black]    -> OK <game> <color>          create a game and take a side
+    JOIN <game>          -> OK <game> <color>          take the free side of a game
+    MOVE <game> <uci>    -> OK <game> <status> <fen>   play a move, e.g. e2e4 or e7e8q
+    RESIGN <game>        -> OK <game> <status> <fen>
+    STATE <game>         -> OK <game> <status> <fen>
+    QUIT                 -> OK bye
+
+Failures reply "ERR <reason>". The opponent of a player who moves or resigns is
+sent an unsolicited "MOVED <game> <uci> <status> <fen>" or
+"RESIGNED <game> <color> <status> <fen>" line.
+
+Try it with a loopback client:
+
+    python server.py --port 7777 &
+    printf 'NEW\\nMOVE 1 e2e4\\nSTATE 1\\n' | nc localhost 7777
+"""
+
+import argparse
+import asyncio
+import itertools
+
+from chess import Game, GameStatus, HumanPlayer, move_uci
+
+COLORS = ("white", "black")
+
+
+class GameSession:
+    """One hosted game, the writers of its two players, and the lock serializing its moves."""
+
+    __slots__ = ("id", "game", "lock", "writers")
+
+    def __init__(self, game_id):
+        self.id = game_id
+        # Shared piece objects and a 2-byte move history keep an idle game small
+        self.game = Game(headless=True, compact_history=True, compact_board=True)
+        self.game.initialize(HumanPlayer(True), HumanPlayer(False))
+        self.lock = asyncio.Lock()
+        self.writers = [None, None]  # indexed like COLORS
+
+    def state(self):
+        return "%d %s %s" % (self.id, self.game.get_status().name, self.game.to_fen())
+
+    def notify(self, color, line):
+        """Send a line to the player of the other color, if connected, without waiting."""
+        writer = self.writers[1 - color]
+        if writer is not None and not writer.is_closing():
+            writer.write(line.encode() + b"\n")
+
+
+async def _read_line(reader):
+    """Return the next line, b"" at end of stream, or None for a line over the stream limit.
+
+    An overlong line is read and discarded in limit-sized pieces, so one
+    client cannot make the server buffer it.
+    """
+    too_long = False
+    while True:
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            line = error.partial
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+            too_long = True
+            continue
+        return None if too_long else line
+
+
+class GameServer:
+    def __init__(self):
+        self.sessions = {}  # game id -> GameSession
+        self._ids = itertools.count(1)
+
+    async def start(self, host="127.0.0.1", port=7777):
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def handle_client(self, reader, writer):
+        seats = {}  # game id -> color this connection plays
+        try:
+            while True:
+                line = await _read_line(reader)
+                if line is None:
+                    writer.write(b"ERR line too long\n")
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                words = line.decode("ascii", "replace").split()
+                if not words:
+                    continue
+                command = words[0].upper()
+                if command == "QUIT":
+                    writer.write(b"OK bye\n")
+                    break
+                handler = self.COMMANDS.get(command)
+                if handler is None:
+                    reply = "ERR unknown command %s" % command
+                else:
+                    try:
+                        reply = await handler(self, seats, writer, words[1:])
+                    except (IndexError, ValueError):
+                        reply = "ERR bad arguments for %s" % command
+                writer.write(reply.encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._leave(seats, writer)
+            writer.close()
+
+    def _leave(self, seats, writer):
+        for game_id, color in seats.items():
+            session = self.sessions.get(game_id)
+            if session is None:
+                continue
+            if session.writers[color] is writer:
+                session.writers[color] = None
+            if session.writers == [None, None]:
+                del self.sessions[game_id]
+
+    def _session(self, words):
+        return self.sessions.get(int(words[0]))
+
+    async def _new(self, seats, writer, words):
+        color = COLORS.index(words[0].lower()) if words else 0
+        session = GameSession(next(self._ids))
+        session.writers[color] = writer
+        self.sessions[session.id] = session
+        seats[session.id] = color
+        return "OK %d %s" % (session.id, COLORS[color])
+
+    async def _join(self, seats, writer, words):
+        session = self._session(words)
+        if session is None:
+            return "ERR no such game"
+        if session.id in seats:
+            return "ERR already playing game %d" % session.id
+        async with session.lock:
+            if None not in session.writers:
+                return "ERR game %d is full" % session.id
+            color = session.writers.index(None)
+            session.writers[color] = writer
+        seats[session.id] = color
+        return "OK %d %s" % (session.id, COLORS[color])
+
+    async def _move(self, seats, writer, words):
+        session = self._session(words)
+        if session is None or session.id not in seats:
+            return "ERR not playing that game"
+        color = seats[session.id]
+        async with session.lock:
+            game = session.game
+            if game.is_end():
+                return "ERR game over"
+            if game.board.white_to_move != (color == 0):
+                return "ERR not your turn"
+            code = game.board.parse_uci(words[1].lower())
+            if code is None:
+                return "ERR illegal move %s" % words[1]
+            game.play(code)
+            state = session.state()
+            session.notify(color, "MOVED %d %s %s" % (session.id, move_uci(code), state.split(" ", 1)[1]))
+        return "OK " + state
+
+    async def _resign(self, seats, writer, words):
+        session = self._session(words)
+        if session is None or session.id not in seats:
+            return "ERR not playing that game"
+        color = seats[session.id]
+        async with session.lock:
+            if session.game.is_end():
+                return "ERR game over"
+            session.game.set_status(GameStatus.RESIGNATION)
+            state = session.state()
+            session.notify(color, "RESIGNED %d %s %s" % (session.id, COLORS[color], state.split(" ", 1)[1]))
+        return "OK " + state
+
+    async def _state(self, seats, writer, words):
+        session = self._session(words)
+        if session is None:
+            return "ERR no such game"
+        return "OK " + session.state()
+
+    COMMANDS = {
+        "NEW": _new,
+        "JOIN": _join,
+        "MOVE": _move,
+        "RESIGN": _resign,
+        "STATE": _state,
+    }
+
+
+async def serve(host, port):
+    server = await GameServer().start(host, port)
+    print("Serving chess games on %s" % ", ".join(
+        "%s:%d" % sock.getsockname()[:2] for sock in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host chess games over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+"""Self-play match between two ComputerPlayer configurations on every CPU core.
+
+    python tournament.py --games 200 --openings openings.txt --a-depth 4 --b-depth 3
+
+Each line of the openings file is either a FEN (or EPD) or a list of UCI moves
+from the start position; blank lines and lines starting with '#' are skipped.
+Every opening is played twice with the colors swapped, and the summary
+reports engine A's wins, draws and losses, the Elo difference with a 95%
+error margin, and each engine's search speed.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chess import START_FEN, ComputerPlayer, Game, GameStatus
+
+# disabled names Search switches to turn off, e.g. ("null_move", "lmr")
+EngineConfig = namedtuple("EngineConfig", "depth movetime hash_mb disabled", defaults=((),))
+
+SEARCH_SWITCHES = ("null_move", "lmr", "futility", "pvs", "aspiration")
+
+GameResult = namedtuple("GameResult", "index a_white score plies nodes seconds")
+
+# Players are reused across the games a worker process plays, so their
+# transposition tables are allocated once; keyed by (config, white)
+_players = {}
+
+
+def _player(config, white):
+    player = _players.get((config, white))
+    if player is None:
+        player = ComputerPlayer(white, config.depth, config.movetime, config.hash_mb)
+        for name in config.disabled:
+            setattr(player.search, name, False)
+        _players[config, white] = player
+    else:
+        player.search.tt.clear()
+    return player
+
+
+def read_openings(path):
+    """Return the openings in a file as (fen, moves) pairs."""
+    openings = []
+    with open(path) as stream:
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "/" in line:
+                fields = line.split(";")[0].split()
+                # A FEN ends in two move counters; an EPD line has opcodes there instead
+                if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                    fen = " ".join(fields[:6])
+                else:
+                    fen = " ".join(fields[:4] + ["0", "1"])
+                openings.append((fen, []))
+            else:
+                openings.append((START_FEN, line.split()))
+    return openings
+
+
+def play_game(index, opening, a_config, b_config, a_white, max_plies):
+    """Play one game and return its GameResult, scored from engine A's side."""
+    white_config, black_config = (a_config, b_config) if a_white else (b_config, a_config)
+    players = (_player(white_config, True), _player(black_config, False))
+    game = Game(headless=True, compact_history=True)
+    fen, moves = opening
+    game.initialize(players[0], players[1], fen)
+    for text in moves:
+        code = game.board.parse_uci(text)
+        if code is None:
+            raise ValueError("Illegal opening move %s" % text)
+        game.play(code)
+
+    nodes = [0, 0]  # indexed by 0 for white, 1 for black
+    seconds = [0.0, 0.0]
+    plies = 0
+    while not game.is_end() and plies < max_plies:
+        side = 0 if game.board.white_to_move else 1
+        started = time.perf_counter()
+        if not game.computer_move():
+            break
+        seconds[side] += time.perf_counter() - started
+        nodes[side] += players[side].search.nodes
+        plies += 1
+
+    status = game.get_status()
+    if status == GameStatus.WHITE_WIN:
+        white_score = 1.0
+    elif status == GameStatus.BLACK_WIN:
+        white_score = 0.0
+    else:
+        white_score = 0.5  # stalemate, draw rules or adjudicated at max_plies
+    if not a_white:
+        nodes.reverse()
+        seconds.reverse()
+    return GameResult(index, a_white, white_score if a_white else 1.0 - white_score,
+                      plies, tuple(nodes), tuple(seconds))
+
+
+def elo_difference(wins, draws, losses):
+    """Return (elo, margin) for the first engine, with a 95% confidence margin."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return math.copysign(math.inf, score - 0.5), math.inf
+
+    def elo(value):
+        return -400 * math.log10(1 / value - 1) + 0.0  # no "-0.0" for an even score
+
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2
+                + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = max(score - margin, 1e-9), min(score + margin, 1 - 1e-9)
+    return elo(score), (elo(high) - elo(low)) / 2
+
+
+def run_match(a_config, b_config, games, openings, workers=None, max_plies=400, progress=None):
+    """Play a match and return the list of GameResults in game order."""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, index, openings[index // 2 % len(openings)],
+                                   a_config, b_config, index % 2 == 0, max_plies)
+                   for index in range(games)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if progress is not None:
+                progress(result, len(results))
+    results.sort(key=lambda result: result.index)
+    return results
+
+
+def print_summary(results, elapsed):
+    wins = sum(1 for result in results if result.score == 1.0)
+    losses = sum(1 for result in results if result.score == 0.0)
+    draws = len(results) - wins - losses
+    elo, margin = elo_difference(wins, draws, losses)
+    print("Games: %d  A wins: %d  draws: %d  A losses: %d" % (len(results), wins, draws, losses))
+    print("Score: %.1f/%d  Elo difference: %+.1f +/- %.1f"
+          % (wins + draws / 2, len(results), elo, margin))
+    for side, name in enumerate("AB"):
+        nodes = sum(result.nodes[side] for result in results)
+        seconds = sum(result.seconds[side] for result in results)
+        print("Engine %s: %d nodes in %.1fs search time, %.0f nps"
+              % (name, nodes, seconds, nodes / seconds if seconds else 0))
+    plies = sum(result.plies for result in results)
+    print("%d plies in %.1fs wall time" % (plies, elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a match between two engine configurations")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--openings", help="file of FENs or UCI move lists, one per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-plies", type=int, default=400, help="adjudicate a draw after this many plies")
+    for name in "ab":
+        parser.add_argument("--%s-depth" % name, type=int, default=None)
+        parser.add_argument("--%s-movetime" % name, type=float, default=None,
+                            help="seconds per move, 0.1 unless a depth is given")
+        parser.add_argument("--%s-hash" % name, type=int, default=4, help="transposition table size in MB")
+        parser.add_argument("--%s-disable" % name, default="", metavar="SWITCHES",
+                            help="comma-separated search features to turn off: %s" % ", ".join(SEARCH_SWITCHES))
+    args = parser.parse_args()
+
+    openings = read_openings(args.openings) if args.openings else [(START_FEN, [])]
+    if not openings:
+        sys.exit("No openings in %s" % args.openings)
+    configs = []
+    for depth, movetime, hash_mb, disable in ((args.a_depth, args.a_movetime, args.a_hash, args.a_disable),
+                                              (args.b_depth, args.b_movetime, args.b_hash, args.b_disable)):
+        disabled = tuple(name for name in disable.split(",") if name)
+        unknown = set(disabled) - set(SEARCH_SWITCHES)
+        if unknown:
+            sys.exit("Unknown search features: %s" % ", ".join(sorted(unknown)))
+        configs.append(EngineConfig(depth, 0.1 if depth is None and movetime is None else movetime,
+                                    hash_mb, disabled))
+    a_config, b_config = configs
+
+    def progress(result, done):
+        print("game %d/%d: A %s, %s, %d plies" % (
+            done, args.games, "white" if result.a_white else "black",
+            {1.0: "win", 0.5: "draw", 0.0: "loss"}[result.score], result.plies), flush=True)
+
+    started = time.perf_counter()
+    results = run_match(a_config, b_config, args.games, openings, args.workers, args.max_plies, progress)
+    print_summary(results, time.perf_counter() - started)
@@ -0,0 +1,217 @@
+"""UCI front-end, so GUIs and tournament managers can run the engine.
+
+    python uci.py
+
+The search runs on a worker thread while the main thread keeps reading
+commands, so "stop" and "isready" are answered during a search. Consecutive
+"position ... moves ..." commands usually extend the previous move list; only
+the new moves are played, and a changed tail is taken back with Game.undo(),
+so long games are not replayed from the start on every move.
+"""
+
+import sys
+import threading
+import time
+
+from chess import (
+    MATE_SCORE, MAX_PLY, START_FEN, Game, HumanPlayer, LazySmpSearch, Search, move_uci,
+)
+
+ENGINE_NAME = "chess_game"
+ENGINE_AUTHOR = "chess_game contributors"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 4096
+MAX_THREADS = 256
+MOVE_OVERHEAD = 30  # milliseconds kept back for communication on every move
+
+
+def time_budget(remaining, increment=0, moves_to_go=None):
+    """Return the seconds to spend on a move given the clock and increment in milliseconds."""
+    budget = remaining / (moves_to_go or 30) + increment * 3 // 4
+    budget = min(budget, remaining - MOVE_OVERHEAD)
+    return max(budget, 10) / 1000
+
+
+def format_score(score):
+    if abs(score) >= MATE_SCORE - MAX_PLY:
+        plies = MATE_SCORE - abs(score)
+        return "mate %d" % ((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+    return "cp %d" % score
+
+
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self._output_lock = threading.Lock()
+        self.hash_mb = DEFAULT_HASH_MB
+        self.threads = 1  # more than one searches with Lazy SMP helper processes
+        self.search = Search(DEFAULT_HASH_MB)
+        self.game = Game(headless=True, compact_history=True)
+        self.game.initialize(HumanPlayer(True), HumanPlayer(False))
+        self.position_fen = START_FEN
+        self.position_moves = []  # UCI strings of the moves played from position_fen
+        self._thread = None
+        self._stop = threading.Event()
+
+    def send(self, line):
+        with self._output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, stream=sys.stdin):
+        for line in stream:
+            if not self.command(line):
+                break
+        self.close()
+
+    def command(self, line):
+        """Handle one line of input; return False after "quit"."""
+        words = line.split()
+        if not words:
+            return True
+        name, args = words[0], words[1:]
+        if name == "uci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("id author %s" % ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("uciok")
+        elif name == "isready":
+            self.send("readyok")
+        elif name == "ucinewgame":
+            self.stop()
+            self.search.tt.clear()
+        elif name == "setoption":
+            self.set_option(args)
+        elif name == "position":
+            self.stop()
+            self.set_position(args)
+        elif name == "go":
+            self.stop()
+            self.go(args)
+        elif name == "stop":
+            self.stop()
+        elif name == "quit":
+            return False
+        return True
+
+    def set_option(self, args):
+        text = " ".join(args)
+        if " value " not in text:
+            return
+        option, value = text.split(" value ", 1)
+        option = option.replace("name", "", 1).strip().lower()
+        if option not in ("hash", "threads"):
+            return
+        try:
+            value = int(value)
+        except ValueError:
+            self.send("info string invalid value %s for option %s" % (value.strip(), option))
+            return
+        if option == "hash":
+            self.hash_mb = min(max(1, value), MAX_HASH_MB)
+        else:
+            self.threads = min(max(1, value), MAX_THREADS)
+        self.stop()
+        if isinstance(self.search, LazySmpSearch):
+            self.search.close()
+        if self.threads > 1:
+            self.search = LazySmpSearch(self.hash_mb, self.threads - 1)
+        else:
+            self.search = Search(self.hash_mb)
+
+    def set_position(self, args):
+        if "moves" in args:
+            index = args.index("moves")
+            setup, moves = args[:index], args[index + 1:]
+        else:
+            setup, moves = args, []
+        if not setup:
+            return
+        fen = START_FEN if setup[0] == "startpos" else " ".join(setup[1:])
+        game = self.game
+
+        if fen == self.position_fen:
+            # Keep the moves shared with the last position, take back the rest
+            common = 0
+            limit = min(len(moves), len(self.position_moves))
+            while common < limit and moves[common] == self.position_moves[common]:
+                common += 1
+            for _ in range(len(self.position_moves) - common):
+                game.undo()
+            del self.position_moves[common:]
+        else:
+            try:
+                game.load_fen(fen)
+            except ValueError as error:
+                # The game keeps the last position, which load_fen leaves untouched
+                self.send("info string %s" % error)
+                return
+            self.position_fen = fen
+            self.position_moves = []
+
+        for text in moves[len(self.position_moves):]:
+            code = game.board.parse_uci(text)
+            if code is None:
+                self.send("info string illegal move %s" % text)
+                break
+            game.play(code)
+            self.position_moves.append(text)
+
+    def go(self, args):
+        options = {}
+        infinite = False
+        for index, word in enumerate(args):
+            if word == "infinite":
+                infinite = True
+            elif index + 1 < len(args) and args[index + 1].lstrip("-").isdigit():
+                options[word] = int(args[index + 1])
+
+        depth = options.get("depth")
+        movetime = None
+        if "movetime" in options:
+            movetime = options["movetime"] / 1000
+        else:
+            side = "w" if self.game.board.white_to_move else "b"
+            if side + "time" in options:
+                movetime = time_budget(options[side + "time"], options.get(side + "inc", 0),
+                                       options.get("movestogo"))
+        if depth is None and movetime is None:
+            infinite = True
+
+        self._stop.clear()
+        board = self.game.board.copy()
+        self._thread = threading.Thread(target=self._think, args=(board, depth, movetime, infinite),
+                                        daemon=True)
+        self._thread.start()
+
+    def _think(self, board, depth, movetime, infinite):
+        started = time.perf_counter()
+
+        def info(search):
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            pv = " ".join(move_uci(move) for move in search.principal_variation(board, search.depth))
+            self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+                search.depth, format_score(search.score), search.nodes,
+                search.nodes / elapsed, elapsed * 1000, pv))
+
+        best = self.search.search(board, depth, movetime, self._stop, info)
+        if infinite:
+            # The protocol only allows bestmove once the GUI says stop
+            self._stop.wait()
+        self.send("bestmove %s" % (move_uci(best) if best is not None else "0000"))
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        if isinstance(self.search, LazySmpSearch):
+            self.search.close()
+
+
+if __name__ == "__main__":
+    UciEngine().run()